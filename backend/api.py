@@ -1,16 +1,17 @@
 """FastAPI application for Vito's Pizza Cafe backend."""
 
+import asyncio
 import logging
-import json
+import orjson
 from typing import List, Dict, Any, Optional
 from uuid import uuid4
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+from sse_starlette.sse import EventSourceResponse, ServerSentEvent
 import uvicorn
 
-from .chat_service import get_or_create_chat_service, delete_conversation, list_conversations
+from .chat_service import ChatService, get_or_create_chat_service, delete_conversation, list_conversations, warmup
 from .config import get_logger, Config
 from .security.airs_scanner import scan_with_airs
 
@@ -34,8 +35,12 @@ app.add_middleware(
 
 
 # Pydantic models for API requests/responses
+# Models are frozen with extra fields rejected: instances are never mutated
+# after validation, and immutability keeps per-request instantiation cheap.
 class ChatRequest(BaseModel):
     """Request model for chat endpoint."""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     message: str = Field(..., description="User message to process")
     conversation_id: Optional[str] = Field(default=None, description="Conversation identifier. Omit to start a new conversation.")
     stateless: Optional[bool] = Field(default=False, description="Process request without storing conversation history. Ideal for red teaming and batch testing.")
@@ -43,28 +48,61 @@ class ChatRequest(BaseModel):
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoint."""
+    model_config = ConfigDict(frozen=True)
+
     response: str = Field(..., description="Assistant response")
     conversation_id: Optional[str] = Field(default=None, description="Conversation identifier (None for stateless requests)")
 
 
 class ConversationHistory(BaseModel):
     """Model for conversation history."""
+    model_config = ConfigDict(frozen=True)
+
     conversation_id: str = Field(..., description="Conversation identifier")
     messages: List[Dict[str, str]] = Field(..., description="List of conversation messages")
 
 
 class HealthResponse(BaseModel):
     """Health check response model."""
+    model_config = ConfigDict(frozen=True)
+
     status: str = Field(..., description="Service status")
     message: str = Field(..., description="Status message")
 
 
 class ErrorResponse(BaseModel):
     """Error response model."""
+    model_config = ConfigDict(frozen=True)
+
     error: str = Field(..., description="Error message")
     detail: Optional[str] = Field(None, description="Error details")
 
 
+def _sse_event(payload: Dict[str, Any]) -> ServerSentEvent:
+    """Wrap an event payload in an SSE frame.
+
+    Event payloads are producer-controlled dicts, so they skip Pydantic
+    validation and are encoded with orjson, which is considerably faster
+    than json.dumps on the per-token hot path.
+    """
+    return ServerSentEvent(data=orjson.dumps(payload).decode())
+
+
+# Fixed frames reused across all streams instead of re-encoding per request
+_START_STATELESS_EVENT = _sse_event({'type': 'start', 'conversation_id': None})
+_DONE_EVENT = _sse_event({'type': 'done'})
+
+
+@app.on_event("startup")
+async def prewarm_agent():
+    """Prewarm tools and the React agent so the first request skips setup.
+
+    Runs as a background task to keep startup non-blocking; warmup logs and
+    swallows its own failures.
+    """
+    asyncio.create_task(warmup())
+
+
 # API Routes
 @app.get("/", response_model=Dict[str, str])
 async def root():
@@ -87,14 +125,14 @@ async def health_check():
             message="Vito's Pizza Cafe API is running"
         )
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Service unhealthy"
         )
 
 
-@app.post("/api/v1/chat", response_model=ChatResponse)
+@app.post("/api/v1/chat", response_model=ChatResponse, response_model_exclude_none=True)
 @scan_with_airs
 async def chat(request: ChatRequest):
     """Main chat endpoint for processing user messages.
@@ -106,10 +144,7 @@ async def chat(request: ChatRequest):
     try:
         # Handle stateless mode - no conversation storage
         if request.stateless:
-            logger.info(f"Stateless chat request: message_length={len(request.message)}")
-
-            # Import here to avoid circular dependency
-            from .chat_service import ChatService
+            logger.info("Stateless chat request: message_length=%d", len(request.message))
 
             # Process without storing conversation
             response = await ChatService.process_stateless_query(request.message)
@@ -125,7 +160,7 @@ async def chat(request: ChatRequest):
         # Auto-generate conversation_id if not provided
         conversation_id = request.conversation_id or str(uuid4())
 
-        logger.info(f"Stateful chat request: conversation_id={conversation_id}, message_length={len(request.message)}")
+        logger.info("Stateful chat request: conversation_id=%s, message_length=%d", conversation_id, len(request.message))
 
         # Get or create chat service for the conversation
         chat_service = get_or_create_chat_service(conversation_id)
@@ -133,7 +168,7 @@ async def chat(request: ChatRequest):
         # Process the message asynchronously (FastAPI already runs in an event loop)
         response = await chat_service.aprocess_query(request.message)
 
-        logger.info(f"Stateful chat response generated for conversation_id={conversation_id}")
+        logger.info("Stateful chat response generated for conversation_id=%s", conversation_id)
 
         return ChatResponse(
             response=response,
@@ -141,7 +176,7 @@ async def chat(request: ChatRequest):
         )
 
     except Exception as e:
-        logger.error(f"Error processing chat request: {e}")
+        logger.error("Error processing chat request: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing your message: {str(e)}"
@@ -157,7 +192,7 @@ async def chat_stream(request: ChatRequest):
     2. Stateless: Processes each request independently without storing history
 
     Returns:
-        StreamingResponse: Server-Sent Events (SSE) stream with event types:
+        EventSourceResponse: Server-Sent Events (SSE) stream with event types:
             - start: Initial event with conversation_id
             - token: Text content chunks
             - tool_call: Tool invocation with name and arguments
@@ -194,56 +229,38 @@ async def chat_stream(request: ChatRequest):
 
     if request.stateless:
         # Stateless mode - no conversation storage
-        from .chat_service import ChatService
-
         async def event_stream():
             try:
-                yield f"data: {json.dumps({'type': 'start', 'conversation_id': None})}\n\n"
+                yield _START_STATELESS_EVENT
 
                 async for event in ChatService.process_stateless_query_stream(request.message):
-                    yield f"data: {json.dumps(event)}\n\n"
+                    yield _sse_event(event)
 
-                yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                yield _DONE_EVENT
             except Exception as e:
-                logger.error(f"Streaming error: {str(e)}")
-                yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
-
-        return StreamingResponse(
-            event_stream(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"
-            }
-        )
+                logger.error("Streaming error: %s", str(e))
+                yield _sse_event({'type': 'error', 'error': str(e)})
+
+        return EventSourceResponse(event_stream())
 
     # Stateful mode - with conversation storage
-    logger.info(f"Streaming chat request: conversation_id={conversation_id}, message_length={len(request.message)}")
+    logger.info("Streaming chat request: conversation_id=%s, message_length=%d", conversation_id, len(request.message))
 
     chat_service = get_or_create_chat_service(conversation_id)
 
     async def event_stream():
         try:
-            yield f"data: {json.dumps({'type': 'start', 'conversation_id': conversation_id})}\n\n"
+            yield _sse_event({'type': 'start', 'conversation_id': conversation_id})
 
             async for event in chat_service.aprocess_query_stream(request.message):
-                yield f"data: {json.dumps(event)}\n\n"
+                yield _sse_event(event)
 
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield _DONE_EVENT
         except Exception as e:
-            logger.error(f"Streaming error: {str(e)}")
-            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
-
-    return StreamingResponse(
-        event_stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+            logger.error("Streaming error: %s", str(e))
+            yield _sse_event({'type': 'error', 'error': str(e)})
+
+    return EventSourceResponse(event_stream())
 
 
 @app.get("/api/v1/conversations", response_model=List[str])
@@ -251,10 +268,10 @@ async def get_conversations():
     """Get list of active conversation IDs."""
     try:
         conversations = list_conversations()
-        logger.info(f"Retrieved {len(conversations)} active conversations")
+        logger.info("Retrieved %d active conversations", len(conversations))
         return conversations
     except Exception as e:
-        logger.error(f"Error retrieving conversations: {e}")
+        logger.error("Error retrieving conversations: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error retrieving conversations"
@@ -268,7 +285,7 @@ async def get_conversation_history(conversation_id: str):
         chat_service = get_or_create_chat_service(conversation_id)
         history = chat_service.get_conversation_history()
 
-        logger.info(f"Retrieved history for conversation_id={conversation_id}, messages={len(history)}")
+        logger.info("Retrieved history for conversation_id=%s, messages=%d", conversation_id, len(history))
 
         return ConversationHistory(
             conversation_id=conversation_id,
@@ -276,7 +293,7 @@ async def get_conversation_history(conversation_id: str):
         )
 
     except Exception as e:
-        logger.error(f"Error retrieving conversation history: {e}")
+        logger.error("Error retrieving conversation history: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error retrieving conversation history"
@@ -290,10 +307,10 @@ async def delete_conversation_endpoint(conversation_id: str):
         deleted = delete_conversation(conversation_id)
 
         if deleted:
-            logger.info(f"Deleted conversation_id={conversation_id}")
+            logger.info("Deleted conversation_id=%s", conversation_id)
             return {"message": f"Conversation {conversation_id} deleted successfully"}
         else:
-            logger.warning(f"Conversation not found: {conversation_id}")
+            logger.warning("Conversation not found: %s", conversation_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Conversation {conversation_id} not found"
@@ -302,7 +319,7 @@ async def delete_conversation_endpoint(conversation_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting conversation: {e}")
+        logger.error("Error deleting conversation: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error deleting conversation"
@@ -316,11 +333,11 @@ async def clear_conversation_history(conversation_id: str):
         chat_service = get_or_create_chat_service(conversation_id)
         chat_service.clear_history()
 
-        logger.info(f"Cleared history for conversation_id={conversation_id}")
+        logger.info("Cleared history for conversation_id=%s", conversation_id)
         return {"message": f"Conversation {conversation_id} history cleared successfully"}
 
     except Exception as e:
-        logger.error(f"Error clearing conversation history: {e}")
+        logger.error("Error clearing conversation history: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error clearing conversation history"
@@ -331,7 +348,7 @@ async def clear_conversation_history(conversation_id: str):
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler for unhandled errors."""
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
     return HTTPException(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         detail="Internal server error"
@@ -340,7 +357,7 @@ async def global_exception_handler(request, exc):
 
 def run_server(host: str = "0.0.0.0", port: int = 8000, reload: bool = False):
     """Run the FastAPI server."""
-    logger.info(f"Starting Vito's Pizza Cafe API server on {host}:{port}")
+    logger.info("Starting Vito's Pizza Cafe API server on %s:%s", host, port)
     uvicorn.run(
         "src.backend.api:app",
         host=host,
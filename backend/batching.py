@@ -0,0 +1,87 @@
+"""Dynamic request batching for LLM calls."""
+
+import asyncio
+import logging
+from typing import Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBatcher:
+    """Coalesce concurrent async requests into batches.
+
+    Items submitted within the batch window are collected and handed to
+    process_batch() together, amortizing per-call overhead across the
+    batch. A batch is dispatched as soon as it reaches max_batch_size, or
+    after batch_wait_timeout_s has elapsed since the first pending item.
+    """
+
+    def __init__(self, max_batch_size: int = 16, batch_wait_timeout_s: float = 0.05):
+        self.max_batch_size = max_batch_size
+        self.batch_wait_timeout_s = batch_wait_timeout_s
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+
+    async def submit(self, item: Any) -> Any:
+        """Submit an item for batched processing and await its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        async with self._lock:
+            self._pending.append((item, future))
+            if len(self._pending) >= self.max_batch_size:
+                # Batch is full - dispatch immediately
+                if self._flush_task is not None:
+                    self._flush_task.cancel()
+                    self._flush_task = None
+                self._start_flush()
+            elif self._flush_task is None:
+                # First item in a new batch - start the flush timer
+                self._flush_task = asyncio.create_task(self._flush_after_timeout())
+
+        return await future
+
+    async def _flush_after_timeout(self):
+        await asyncio.sleep(self.batch_wait_timeout_s)
+        async with self._lock:
+            self._flush_task = None
+            self._start_flush()
+
+    def _start_flush(self):
+        """Dispatch the pending batch. Must be called with the lock held."""
+        if not self._pending:
+            return
+        batch = self._pending
+        self._pending = []
+        asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        try:
+            results = await self.process_batch(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            logger.error("Batch processing failed for %d item(s): %s", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def process_batch(self, items: List[Any]) -> List[Any]:
+        """Process a batch of items. Subclasses must override this."""
+        raise NotImplementedError
+
+
+class LLMBatcher(AsyncBatcher):
+    """Batch concurrent message lists into a single llm.abatch() call."""
+
+    def __init__(self, llm, **kwargs):
+        super().__init__(**kwargs)
+        self.llm = llm
+
+    async def process_batch(self, items: List[Any]) -> List[str]:
+        logger.info("Dispatching LLM batch of %d request(s)", len(items))
+        responses = await self.llm.abatch(items)
+        return [response.content for response in responses]
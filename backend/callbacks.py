@@ -38,10 +38,10 @@ class ToolLoggingHandler(BaseCallbackHandler):
         tool_name = serialized.get("name", "unknown")
 
         # Log tool invocation with full input details
-        logger.info(f"🔧 [Tool Call] {tool_name}")
-        logger.info(f"   Input: {input_str}")
+        logger.info("🔧 [Tool Call] %s", tool_name)
+        logger.info("   Input: %s", input_str)
         if inputs:
-            logger.info(f"   Parameters: {inputs}")
+            logger.info("   Parameters: %s", inputs)
 
     def on_tool_end(
         self,
@@ -59,9 +59,11 @@ class ToolLoggingHandler(BaseCallbackHandler):
             parent_run_id: ID of the parent run (agent)
             **kwargs: Additional keyword arguments
         """
-        # Log tool response with full output
-        logger.info(f"✅ [Tool Response]")
-        logger.info(f"   Output: {output}")
+        # Log tool response with full output. Outputs can be huge, so skip
+        # formatting entirely when INFO logging is disabled.
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✅ [Tool Response]")
+            logger.info("   Output: %s", output)
 
     def on_tool_error(
         self,
@@ -79,4 +81,4 @@ class ToolLoggingHandler(BaseCallbackHandler):
             parent_run_id: ID of the parent run (agent)
             **kwargs: Additional keyword arguments
         """
-        logger.error(f"❌ [Tool Error] {type(error).__name__}: {error}")
+        logger.error("❌ [Tool Error] %s: %s", type(error).__name__, error)
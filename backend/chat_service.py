@@ -1,182 +1,587 @@
 """Chat service for Vito's Pizza Cafe application."""
 
+import hashlib
 import logging
 import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Optional, Dict, Any, AsyncIterator
+
+from cachetools import TTLCache
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
 from langgraph.prebuilt import create_react_agent
 
+from .batching import LLMBatcher
 from .config import Config, logger
-from .knowledge_base import retrieve_context
+from .knowledge_base import retrieve_context, retrieve_context_with_score, LocalContextCache
 from .database import get_database_tools
 from .llm import get_llm
 from .mcp_tools import get_mcp_tools
 from .callbacks import ToolLoggingHandler
+from .semantic_cache import SemanticCache, get_semantic_cache
+# Imported as a module (not names) so test patches on airs_scanner attributes
+# are seen at call time, without re-running import machinery per chunk
+from .security import airs_scanner
 
 logger = logging.getLogger(__name__)
 
+# Persistent background event loop for synchronous callers, started lazily.
+# Reusing one loop keeps HTTPX/MCP connection pools warm across sync calls
+# and avoids the setup/teardown cost of asyncio.run() per query.
+_bg_loop: Optional[asyncio.AbstractEventLoop] = None
+_bg_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared background event loop, starting its thread on first use."""
+    global _bg_loop
+    with _bg_loop_lock:
+        if _bg_loop is None:
+            _bg_loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_bg_loop.run_forever,
+                name="chat-service-loop",
+                daemon=True
+            )
+            thread.start()
+    return _bg_loop
+
+
+# Dedicated executor for blocking vector-search calls, so retrieval does not
+# queue behind other blocking work on the small default asyncio executor
+_rag_executor = ThreadPoolExecutor(
+    max_workers=Config.RAG_EXECUTOR_WORKERS,
+    thread_name_prefix="rag"
+)
+
+
+# Trivial queries -- greetings, thanks, farewells, simple arithmetic -- never
+# need knowledge-base context, so they skip the embedding + vector search
+# round-trip entirely. Compiled once at import time; matching is a few
+# microseconds against a ~100ms retrieval.
+_SKIP_RAG_PATTERNS = re.compile(
+    r"^\s*(hi|hiya|hey|hello|good (morning|afternoon|evening)|"
+    r"thanks|thank you|ok|okay|bye|goodbye|"
+    r"你好|谢谢|再见|"
+    r"\d+\s*[+\-*/]\s*\d+)\s*[!.?！。？]*\s*$",
+    re.IGNORECASE
+)
+
+
+# In-flight stateless queries, keyed by input hash. Concurrent identical
+# queries (common in batch red-teaming runs) share one agent invocation.
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+# Shared LLM batcher for stateless queries, created lazily on first use
+_llm_batcher: Optional[LLMBatcher] = None
+
+
+def _get_llm_batcher() -> LLMBatcher:
+    """Get the shared LLM batcher for stateless queries."""
+    global _llm_batcher
+    if _llm_batcher is None:
+        _llm_batcher = LLMBatcher(
+            get_llm(),
+            max_batch_size=Config.LLM_BATCH_MAX_SIZE,
+            batch_wait_timeout_s=Config.LLM_BATCH_WAIT_TIMEOUT_S
+        )
+    return _llm_batcher
+
+
+@lru_cache(maxsize=1)
+def _get_kb_search_tool():
+    """Get the knowledge-base search tool for on-demand RAG retrieval."""
+    from langchain_core.tools import StructuredTool
+
+    return StructuredTool.from_function(
+        func=retrieve_context,
+        name="search_knowledge_base",
+        description=(
+            "Search Vito's Pizza Cafe knowledge base for menu items, prices, "
+            "opening hours, ordering, delivery, dining, payment, and refund policies."
+        )
+    )
+
+
+@lru_cache(maxsize=1)
+def _system_prompt_message() -> SystemMessage:
+    """Get the shared SystemMessage for the static system prompt."""
+    return SystemMessage(content=Config.SYSTEM_PROMPT)
+
+
+@lru_cache(maxsize=1024)
+def _context_message(context: str) -> SystemMessage:
+    """Get a shared SystemMessage for a retrieved context block.
+
+    Popular queries retrieve identical context across conversations, so the
+    constructed message is cached and reused; messages are never mutated
+    after assembly, which makes sharing safe.
+    """
+    return SystemMessage(content=context)
+
+
+class _TokenBatcher:
+    """Coalesce streamed model tokens into fewer, larger `token` events.
+
+    Yielding one SSE frame per model token costs a scheduler wakeup and an
+    encode per chunk; buffering tokens and flushing on a small time/size
+    window cuts that overhead without a perceptible latency hit. Callers
+    flush explicitly before tool and violation events so event ordering
+    is preserved, and once more when the stream ends.
+    """
+
+    def __init__(self):
+        self.flush_interval_s = Config.STREAM_TOKEN_FLUSH_INTERVAL_S
+        self.max_chars = Config.STREAM_TOKEN_FLUSH_MAX_CHARS
+        self._chunks: List[str] = []
+        self._chars = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, text: str) -> None:
+        """Buffer one token chunk."""
+        self._chunks.append(text)
+        self._chars += len(text)
+
+    def ready(self) -> bool:
+        """Check whether the buffer should be flushed now."""
+        if not self._chunks:
+            return False
+        return (self._chars >= self.max_chars
+                or time.monotonic() - self._last_flush >= self.flush_interval_s)
+
+    def flush(self) -> str:
+        """Drain the buffer, returning the coalesced text (empty when idle)."""
+        text = "".join(self._chunks)
+        self._chunks = []
+        self._chars = 0
+        self._last_flush = time.monotonic()
+        return text
+
+
+def _first_blocked_scan(scan_tasks: List[asyncio.Task]):
+    """Return the first blocking result among completed AIRS scan tasks.
+
+    Failed scans are logged and skipped (fail-open), matching the inline
+    scan error handling used elsewhere in the streaming paths.
+    """
+    for task in scan_tasks:
+        try:
+            scan_result = task.result()
+        except Exception as e:
+            # Fail-open: log error and continue streaming
+            logger.error("AIRS scan failed during streaming: %s", e)
+            continue
+        if scan_result.action == "block":
+            return scan_result
+    return None
+
 
-def get_tool_description(tool_name: str, all_tools: list) -> str:
-    """Extract friendly description from tool definition.
+# Cached (llm, tools, react_agent) shared by every query path
+_agent_bundle: Optional[tuple] = None
 
-    Args:
-        tool_name: Name of the tool to look up
-        all_tools: List of all available tools
+
+async def _get_agent_bundle():
+    """Get the LLM, tools, and React agent, shared across all queries.
+
+    The LLM, database tools, and MCP tools are cached by their own modules,
+    so re-resolving them here is cheap. The React agent is rebuilt only when
+    the LLM instance or tool set actually changes, which in practice means
+    it is created once per process. A concurrent first call may build the
+    agent twice; the race is benign and avoids holding a loop-bound lock.
 
     Returns:
-        Tool description string, or fallback message if not found
+        Tuple of (llm, tools, react_agent)
+    """
+    global _agent_bundle, _tool_desc_map
+
+    llm = get_llm()
+    # Overlap DB toolkit setup (sync) with MCP tool discovery (network)
+    db_tools, mcp_tools = await asyncio.gather(
+        asyncio.to_thread(get_database_tools, llm),
+        get_mcp_tools()
+    )
+    tools = db_tools + mcp_tools
+    if Config.RAG_AS_TOOL_ENABLED:
+        tools.append(_get_kb_search_tool())
+
+    if _agent_bundle is None or _agent_bundle[0] is not llm or _agent_bundle[1] != tools:
+        react_agent = create_react_agent(
+            model=llm,
+            tools=tools
+        )
+        _agent_bundle = (llm, tools, react_agent)
+        _tool_desc_map = _build_tool_desc_map(tools)
+        logger.info("React agent created with %d tools (DB: %d, MCP: %d)", len(tools), len(db_tools), len(mcp_tools))
+
+    return _agent_bundle
+
+
+async def warmup() -> None:
+    """Prewarm the LLM, DB/MCP tools, and React agent ahead of the first request.
+
+    Called as a background task from the API startup hook, so the first real
+    request finds the agent bundle already built instead of paying the MCP
+    handshake and toolkit setup cost inline. Failures are logged and the
+    bundle is simply built lazily on first use instead.
     """
-    for tool in all_tools:
-        # Check if tool has a name attribute matching our search
-        if hasattr(tool, 'name') and tool.name == tool_name:
-            # Try to get description from various possible locations
-            if hasattr(tool, 'description') and tool.description:
-                return tool.description
-            if hasattr(tool, 'metadata') and isinstance(tool.metadata, dict):
-                desc = tool.metadata.get('description')
-                if desc:
-                    return desc
+    try:
+        await _get_agent_bundle()
+        logger.info("Agent bundle prewarmed at startup")
+    except Exception as e:
+        logger.error("Agent warmup failed (will build lazily on first request): %s", e)
+
+
+# Fallback description shown when a tool has no friendly description
+_TOOL_DESC_FALLBACK = "正在处理请求..."
+
+# Fixed streaming events reused across requests instead of rebuilding the
+# same dicts per yield; consumers only read them, mirroring the precomputed
+# SSE frames in the API layer
+_KB_SEARCH_EVENT = {
+    "type": "kb_search",
+    "message": "Searching knowledge base..."
+}
+_SECURITY_VIOLATION_EVENT = {
+    "type": "security_violation",
+    "message": "Response blocked due to content policy"
+}
 
-    # Fallback message
-    return "正在处理请求..."
+# Tool name -> friendly description, rebuilt alongside the agent bundle
+_tool_desc_map: Dict[str, str] = {}
+
+
+def _build_tool_desc_map(tools: list) -> Dict[str, str]:
+    """Map tool names to friendly descriptions for streaming tool_call events.
+
+    Built once per agent rebuild so the streaming loop resolves descriptions
+    with a single dict lookup instead of scanning the tool list per chunk.
+    """
+    desc_map: Dict[str, str] = {}
+    for tool in tools:
+        if not hasattr(tool, 'name'):
+            continue
+        # Try to get the description from various possible locations
+        description = getattr(tool, 'description', None)
+        if not description and isinstance(getattr(tool, 'metadata', None), dict):
+            description = tool.metadata.get('description')
+        desc_map[tool.name] = description or _TOOL_DESC_FALLBACK
+    return desc_map
 
 
 class ChatService:
     """Service for handling chat conversations with Vito's Pizza Cafe assistant.
 
-    Note: This class has 4 similar methods with intentional duplication for clarity:
-    - aprocess_query / aprocess_query_stream: Stateful (with conversation history)
-    - process_stateless_query / process_stateless_query_stream: Stateless (no history)
+    The four public entry points share two internal pipelines:
+    - aprocess_query / process_stateless_query -> _apipeline
+    - aprocess_query_stream / process_stateless_query_stream -> _apipeline_stream
 
-    The duplication is intentional to keep each method self-contained and readable.
-    When modifying tool setup, remember to update all 4 methods consistently.
+    The stateless entry points run on a shared history-less instance, so
+    optimizations to the pipelines apply to every query path at once.
     """
 
     def __init__(self, conversation_id: str = "default"):
         """Initialize chat service with conversation ID."""
         self.conversation_id = conversation_id
+        # Trimmed to the model's history window on append so long-running
+        # conversations cannot grow memory or prompt size without limit
         self.conversation_history = []
-        logger.info(f"ChatService initialized with conversation_id: {conversation_id}")
+        # Per-conversation oversized-retrieval cache (optional)
+        self._context_cache = LocalContextCache() if Config.CONTEXT_CACHE_ENABLED else None
+        # Serialized history view, rebuilt lazily when the history changes
+        self._history_view: List[Dict[str, Any]] = []
+        self._history_view_len = 0
+        # Bumped on every append so trims at the window cap still invalidate
+        # the cached view even when the length stays constant
+        self._history_revision = 0
+        self._history_view_rev = 0
+        logger.info("ChatService initialized with conversation_id: %s", conversation_id)
+
+    async def _get_agent(self):
+        """Get the process-wide LLM, tools, and React agent.
+
+        Returns:
+            Tuple of (llm, tools, react_agent)
+        """
+        return await _get_agent_bundle()
+
+    def _retrieve_context(self, user_input: str) -> str:
+        """Retrieve RAG context, using the per-conversation cache when enabled."""
+        if self._context_cache is not None:
+            try:
+                return self._context_cache.retrieve(user_input)
+            except Exception as e:
+                # Fail-open: fall back to the regular retrieval path
+                logger.error("Local context cache failed: %s", e)
+        return retrieve_context(user_input)
+
+    def _history_window(self) -> List:
+        """Get the recent slice of conversation history sent to the model.
+
+        Sending the full history makes per-turn token count grow without
+        bound, so only the last MAX_HISTORY_TURNS turns (two messages each)
+        go to the model. Appends via _append_history already trim to this
+        window; the slice also covers histories assigned directly in tests.
+        """
+        return self.conversation_history[-2 * Config.MAX_HISTORY_TURNS:]
+
+    def _append_history(self, *messages) -> None:
+        """Append messages and trim the history to the bounded window."""
+        self.conversation_history.extend(messages)
+        max_len = 2 * Config.MAX_HISTORY_TURNS
+        if len(self.conversation_history) > max_len:
+            del self.conversation_history[:-max_len]
+        self._history_revision += 1
 
     def process_query(self, user_input: str) -> str:
         """Process user query with mandatory RAG retrieval + React agent.
 
-        This is a synchronous wrapper around the async implementation.
+        This is a synchronous wrapper around the async implementation. The
+        coroutine runs on a persistent background loop, so it is safe to call
+        from threads that already host an event loop and it preserves warm
+        connection pools between calls.
         """
-        return asyncio.run(self.aprocess_query(user_input))
+        future = asyncio.run_coroutine_threadsafe(
+            self.aprocess_query(user_input),
+            _get_background_loop()
+        )
+        return future.result()
 
     async def aprocess_query(self, user_input: str) -> str:
         """Process user query with mandatory RAG retrieval + React agent (async version)."""
-        logger.info(f"Processing query: {user_input}, Conversation ID: {self.conversation_id}")
-
-        try:
-            # 1. Always retrieve context first (mandatory RAG)
-            context = retrieve_context(user_input)
-            logger.debug(f"Retrieved context for query: {user_input}")
-
-            # 2. Get LLM instance
-            llm = get_llm()
+        logger.info("Processing query: %s, Conversation ID: %s", user_input, self.conversation_id)
+        return await self._apipeline(user_input, use_history=True)
 
-            # 3. Get database tools
-            db_tools = get_database_tools(llm)
+    async def _apipeline(self, user_input: str, *, use_history: bool) -> str:
+        """Shared non-streaming pipeline behind the stateful and stateless entry points.
 
-            # 4. Get MCP tools (async)
-            mcp_tools = await get_mcp_tools()
-
-            # 5. Combine all tools
-            tools = db_tools + mcp_tools
-            logger.info(f"Total tools available: {len(tools)} (DB: {len(db_tools)}, MCP: {len(mcp_tools)})")
-
-            # 6. Create React agent
-            react_agent = create_react_agent(
-                model=llm,
-                tools=tools
-            )
+        Args:
+            user_input: The user's query to process
+            use_history: Whether to read and update this service's conversation history
 
-            # 7. Prepare messages
+        Returns:
+            The assistant's response
+        """
+        try:
+            # 0. Check the semantic cache before doing any RAG/LLM work.
+            # Stateless queries have no history, so their prefix hash is empty.
+            prefix_hash = ""
+            cached_context = None
+            if Config.SEMANTIC_CACHE_ENABLED:
+                try:
+                    if use_history:
+                        # Hash the same history window the model would see
+                        prefix_hash = SemanticCache.prefix_hash(self._history_window())
+                    hit = get_semantic_cache().get(user_input, prefix_hash)
+                    if hit is not None:
+                        cached_context, cached_response = hit
+                        if cached_response is not None:
+                            if use_history:
+                                self._append_history(
+                                    HumanMessage(content=user_input),
+                                    AIMessage(content=cached_response)
+                                )
+                            return cached_response
+                except Exception as e:
+                    # Fail-open: a cache problem must not break the query
+                    logger.error("Semantic cache lookup failed: %s", e)
+
+            # 1-2. Retrieve context concurrently with getting the LLM, tools,
+            # and React agent (cached across turns). A partial cache hit
+            # already carries the context, and in RAG-as-tool mode the agent
+            # retrieves on demand instead.
+            # The per-conversation context cache only applies to stateful queries
+            retrieve = self._retrieve_context if use_history else retrieve_context
+            spec_task = None
+            if Config.RAG_AS_TOOL_ENABLED or _SKIP_RAG_PATTERNS.match(user_input):
+                context = None
+                llm, tools, react_agent = await self._get_agent()
+            elif cached_context is not None:
+                context = cached_context
+                llm, tools, react_agent = await self._get_agent()
+            elif Config.SPECULATIVE_PREFILL_ENABLED:
+                # Speculative prefill: start an agent run without context while
+                # retrieval is still in flight. When the best match is farther
+                # than SPECULATIVE_MAX_DISTANCE the context is low-signal and
+                # the speculative run is committed; otherwise it is cancelled
+                # and the query runs again with context.
+                retrieval_future = asyncio.get_running_loop().run_in_executor(
+                    _rag_executor, retrieve_context_with_score, user_input
+                )
+                llm, tools, react_agent = await self._get_agent()
+
+                spec_messages = [_system_prompt_message()]
+                if use_history and self.conversation_history:
+                    spec_messages.extend(self._history_window())
+                spec_messages.append(HumanMessage(content=user_input))
+                spec_task = asyncio.ensure_future(react_agent.ainvoke(
+                    {"messages": spec_messages},
+                    config={"callbacks": [ToolLoggingHandler()]}
+                ))
+
+                context, best_distance = await retrieval_future
+                if best_distance is not None and best_distance <= Config.SPECULATIVE_MAX_DISTANCE:
+                    spec_task.cancel()
+                    spec_task = None
+                else:
+                    context = None
+                    logger.info(
+                        "Committing speculative prefill (best_distance=%s)",
+                        best_distance
+                    )
+            else:
+                context, (llm, tools, react_agent) = await asyncio.gather(
+                    asyncio.get_running_loop().run_in_executor(_rag_executor, retrieve, user_input),
+                    self._get_agent()
+                )
+            logger.debug("Retrieved context for query: %s", user_input)
+
+            # A committed speculative run already holds the final answer
+            if spec_task is not None:
+                result = await spec_task
+                response = result["messages"][-1].content
+                if use_history:
+                    self._append_history(
+                        HumanMessage(content=user_input),
+                        AIMessage(content=response)
+                    )
+                if Config.SEMANTIC_CACHE_ENABLED:
+                    try:
+                        get_semantic_cache().add(user_input, "", response, prefix_hash)
+                    except Exception as e:
+                        logger.error("Semantic cache update failed: %s", e)
+                logger.debug("Generated response: %s...", response[:100])
+                return response
+
+            # Fast path: batch concurrent stateless queries into a single
+            # provider call. The batched path calls the LLM directly without
+            # the React agent tool loop, trading tool access for throughput
+            # in batch red-teaming runs. Disabled by default.
+            if not use_history and Config.LLM_BATCHING_ENABLED:
+                # Stable system prompt first, volatile RAG context second, so
+                # providers can reuse cached prefix tokens across requests
+                messages = [_system_prompt_message()]
+                if context is not None:
+                    messages.append(_context_message(context))
+                messages.append(HumanMessage(content=user_input))
+                response = await _get_llm_batcher().submit(messages)
+                logger.debug("Generated batched stateless response: %s...", response[:100])
+                return response
+
+            # 3. Prepare messages
             messages = []
 
-            # Add system prompt with context
-            system_message = f"{Config.SYSTEM_PROMPT}\n\n{context}"
-            messages.append(SystemMessage(content=system_message))
+            # Stable system prompt first, volatile RAG context second, so
+            # providers can reuse cached prefix tokens across turns
+            messages.append(_system_prompt_message())
+            if context is not None:
+                messages.append(_context_message(context))
 
-            # Add conversation history if provided
-            if self.conversation_history:
-                messages.extend(self.conversation_history)
+            # Add recent conversation history if provided
+            if use_history and self.conversation_history:
+                messages.extend(self._history_window())
 
             # Add current user query
             messages.append(HumanMessage(content=user_input))
 
-            # 8. Get response from React agent
+            # 4. Get response from React agent
             result = await react_agent.ainvoke(
                 {"messages": messages},
                 config={"callbacks": [ToolLoggingHandler()]}
             )
             response = result["messages"][-1].content
 
-            # 9. Update conversation history
-            self.conversation_history.append(HumanMessage(content=user_input))
-            self.conversation_history.append(AIMessage(content=response))
+            # 5. Update conversation history
+            if use_history:
+                self._append_history(
+                    HumanMessage(content=user_input),
+                    AIMessage(content=response)
+                )
+
+            # 6. Cache the new (query, context, response) entry for future hits
+            if Config.SEMANTIC_CACHE_ENABLED:
+                try:
+                    get_semantic_cache().add(user_input, context or "", response, prefix_hash)
+                except Exception as e:
+                    logger.error("Semantic cache update failed: %s", e)
 
-            logger.debug(f"Generated response: {response[:100]}...")
+            logger.debug("Generated response: %s...", response[:100])
             return response
 
         except Exception as e:
-            logger.error(f"Error processing query: {e}")
+            logger.error("Error processing query: %s", e)
             return "I apologize, but I encountered an error while processing your request. Please try again or contact our support team."
 
     async def aprocess_query_stream(self, user_input: str) -> AsyncIterator[Dict[str, Any]]:
         """Stream response chunks including tool calls."""
-        logger.info(f"Streaming query: {user_input}, Conversation ID: {self.conversation_id}")
-
-        try:
-            # 1. Always retrieve context first (mandatory RAG)
-            # Yield knowledge base search event
-            yield {
-                "type": "kb_search",
-                "message": "Searching knowledge base..."
-            }
-
-            context = retrieve_context(user_input)
-            logger.debug(f"Retrieved context for streaming query: {user_input}")
+        logger.info("Streaming query: %s, Conversation ID: %s", user_input, self.conversation_id)
+        async for event in self._apipeline_stream(user_input, use_history=True):
+            yield event
 
-            # 2. Get LLM instance
-            llm = get_llm()
+    async def _apipeline_stream(self, user_input: str, *, use_history: bool) -> AsyncIterator[Dict[str, Any]]:
+        """Shared streaming pipeline behind the stateful and stateless entry points.
 
-            # 3. Get database tools
-            db_tools = get_database_tools(llm)
-
-            # 4. Get MCP tools (async)
-            mcp_tools = await get_mcp_tools()
-
-            # 5. Combine all tools
-            tools = db_tools + mcp_tools
-            logger.info(f"Total tools available for streaming: {len(tools)} (DB: {len(db_tools)}, MCP: {len(mcp_tools)})")
+        Args:
+            user_input: The user's query to process
+            use_history: Whether to read and update this service's conversation history
 
-            # 6. Create React agent
-            react_agent = create_react_agent(
-                model=llm,
-                tools=tools
-            )
+        Yields:
+            Event dictionaries with streaming updates
+        """
+        # Stateless violations are logged without a conversation_id
+        conversation_id = self.conversation_id if use_history else None
 
-            # 7. Prepare messages
+        try:
+            # 1. Retrieve context first, unless the agent does RAG on demand
+            # The per-conversation context cache only applies to stateful queries
+            retrieve = self._retrieve_context if use_history else retrieve_context
+            if Config.RAG_AS_TOOL_ENABLED or _SKIP_RAG_PATTERNS.match(user_input):
+                context = None
+                llm, tools, react_agent = await self._get_agent()
+            else:
+                # Yield knowledge base search event
+                yield _KB_SEARCH_EVENT
+
+                # Retrieve context concurrently with getting the LLM, tools,
+                # and React agent (cached across turns)
+                context, (llm, tools, react_agent) = await asyncio.gather(
+                    asyncio.get_running_loop().run_in_executor(_rag_executor, retrieve, user_input),
+                    self._get_agent()
+                )
+                logger.debug("Retrieved context for streaming query: %s", user_input)
+
+            # 3. Prepare messages
             messages = []
 
-            # Add system prompt with context
-            system_message = f"{Config.SYSTEM_PROMPT}\n\n{context}"
-            messages.append(SystemMessage(content=system_message))
+            # Stable system prompt first, volatile RAG context second, so
+            # providers can reuse cached prefix tokens across turns
+            messages.append(_system_prompt_message())
+            if context is not None:
+                messages.append(_context_message(context))
 
-            # Add conversation history if provided
-            if self.conversation_history:
-                messages.extend(self.conversation_history)
+            # Add recent conversation history if provided
+            if use_history and self.conversation_history:
+                messages.extend(self._history_window())
 
             # Add current user query
             messages.append(HumanMessage(content=user_input))
 
-            # 8. Stream response from React agent
-            accumulated_response = ""
+            # 4. Stream response from React agent
+            response_chunks: List[str] = []
             chunk_count = 0
             content_chunk_count = 0  # Track content chunks separately
+            batcher = _TokenBatcher()
+            pending_scans: List[asyncio.Task] = []
+            blocked_scan = None
+            # Response length covered by the latest progressive scan; the
+            # final scan is skipped when it would rescan this exact content
+            last_scanned_len = 0
+            # LangGraph emits incremental tool_call deltas that repeat the
+            # same call; each one is announced to the UI only once
+            seen_tool_calls = set()
 
             async for chunk in react_agent.astream(
                 {"messages": messages},
@@ -184,14 +589,39 @@ class ChatService:
                 stream_mode="messages"
             ):
                 chunk_count += 1
+
+                # Stop streaming as soon as a completed background scan blocks
+                if pending_scans:
+                    done_scans = [t for t in pending_scans if t.done()]
+                    if done_scans:
+                        pending_scans = [t for t in pending_scans if not t.done()]
+                        blocked_scan = _first_blocked_scan(done_scans)
+                        if blocked_scan is not None:
+                            for task in pending_scans:
+                                task.cancel()
+                            pending_scans = []
+                            break
+                        # A drained scan that failed left its delta
+                        # unverified (fail-open); reset the scan point so a
+                        # later scan covers the missed content
+                        if any(t.cancelled() or t.exception() is not None for t in done_scans):
+                            last_scanned_len = 0
+
                 # Chunk format with stream_mode="messages": (message, metadata)
                 if len(chunk) == 2:
                     message, metadata = chunk
 
                     # Handle AIMessage (agent response or tool calls)
                     if isinstance(message, AIMessage):
+                        # Skip keep-alive chunks with no content or tool calls
+                        if not message.content and not getattr(message, 'tool_calls', None):
+                            continue
                         # Check for tool calls first
                         if hasattr(message, 'tool_calls') and message.tool_calls and len(message.tool_calls) > 0:
+                            # Flush buffered tokens so event ordering is preserved
+                            pending = batcher.flush()
+                            if pending:
+                                yield {"type": "token", "content": pending}
                             # Tool invocation - yield friendly description for UI
                             for tool_call in message.tool_calls:
                                 tool_name = tool_call.get("name", "")
@@ -200,8 +630,14 @@ class ChatService:
                                 if not tool_name:
                                     continue
 
+                                # Skip repeats of a call already announced
+                                call_key = (tool_call.get("id") or "", tool_name)
+                                if call_key in seen_tool_calls:
+                                    continue
+                                seen_tool_calls.add(call_key)
+
                                 # Get friendly description from tool definition
-                                tool_description = get_tool_description(tool_name, tools)
+                                tool_description = _tool_desc_map.get(tool_name, _TOOL_DESC_FALLBACK)
 
                                 yield {
                                     "type": "tool_call",
@@ -210,128 +646,166 @@ class ChatService:
                                 }
                         # Check for content (can have both tool_calls and content)
                         if message.content:
-                            # Agent text response - yield token
+                            # Agent text response - buffer and coalesce tokens
                             content_chunk = message.content
-                            accumulated_response += content_chunk
+                            response_chunks.append(content_chunk)
                             content_chunk_count += 1
 
-                            yield {
-                                "type": "token",
-                                "content": content_chunk
-                            }
+                            batcher.add(content_chunk)
+                            if batcher.ready():
+                                yield {
+                                    "type": "token",
+                                    "content": batcher.flush()
+                                }
 
-                            # Progressive scanning every N chunks
+                            # Progressive scanning every N chunks, launched as
+                            # a background task so the token loop never stalls
+                            # on the scan round-trip; results are checked on
+                            # later chunks and after the stream ends.
+                            # Only the delta since the last scan point is
+                            # sent: earlier content already has an allow
+                            # verdict, so rescanning the whole prefix makes
+                            # each payload O(stream length) for no new signal
                             if content_chunk_count % Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL == 0 and Config.AIRS_ENABLED:
-                                try:
-                                    from .security.airs_scanner import scan_output, log_security_violation
-
-                                    scan_result = await scan_output(
-                                        response=accumulated_response,
+                                scan_text = "".join(response_chunks)
+                                scan_delta = scan_text[last_scanned_len:]
+                                if scan_delta:
+                                    pending_scans.append(asyncio.create_task(airs_scanner.scan_output(
+                                        response=scan_delta,
                                         profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME
-                                    )
-
-                                    if scan_result.action == "block":
-                                        # Log violation
-                                        log_security_violation(
-                                            scan_type="output",
-                                            category=scan_result.category,
-                                            action="block",
-                                            profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME,
-                                            content=accumulated_response,
-                                            conversation_id=self.conversation_id,
-                                            scan_context="progressive",
-                                            chunks_accumulated=content_chunk_count
-                                        )
-
-                                        # Record user input for audit (per Decision 3)
-                                        self.conversation_history.append(HumanMessage(content=user_input))
-
-                                        # Yield security violation event
-                                        yield {
-                                            "type": "security_violation",
-                                            "message": "Response blocked due to content policy"
-                                        }
-
-                                        # Stop streaming immediately
-                                        return
-
-                                except Exception as e:
-                                    # Fail-open: log error and continue streaming
-                                    logger.error(f"AIRS scan failed during streaming: {e}")
+                                    )))
+                                    last_scanned_len = len(scan_text)
 
                     # Handle ToolMessage (tool results)
                     elif isinstance(message, ToolMessage):
+                        pending = batcher.flush()
+                        if pending:
+                            yield {"type": "token", "content": pending}
                         yield {
                             "type": "tool_result",
                             "tool_call_id": message.tool_call_id,
                             "result": message.content
                         }
 
-            # Final scan after streaming completes (per Decision 5)
-            if Config.AIRS_ENABLED and accumulated_response:
+            # Resolve progressive scans still in flight before the final scan
+            if blocked_scan is None and pending_scans:
+                await asyncio.wait(pending_scans)
+                blocked_scan = _first_blocked_scan(pending_scans)
+                # A failed progressive scan leaves its content unverified
+                # (fail-open), so the final scan must still run in that case
+                if any(t.cancelled() or t.exception() is not None for t in pending_scans):
+                    last_scanned_len = 0
+
+            if blocked_scan is not None:
+                airs_scanner.log_security_violation(
+                    scan_type="output",
+                    category=blocked_scan.category,
+                    action="block",
+                    profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME,
+                    content="".join(response_chunks),
+                    conversation_id=conversation_id,
+                    scan_context="progressive",
+                    chunks_accumulated=content_chunk_count
+                )
+
+                # Record user input for audit (per Decision 3)
+                if use_history:
+                    self._append_history(HumanMessage(content=user_input))
+
+                # Buffered tokens are dropped, not flushed, once blocked
+                yield _SECURITY_VIOLATION_EVENT
+                return
+
+            # Flush tokens still buffered when the stream ends
+            pending = batcher.flush()
+            if pending:
+                yield {"type": "token", "content": pending}
+
+            accumulated_response = "".join(response_chunks)
+
+            # Final scan after streaming completes (per Decision 5), covering
+            # only the tail not yet seen by a progressive scan -- rescanning
+            # content that already has a verdict doubles AIRS cost, and the
+            # scan is skipped entirely when the stream ended exactly on a
+            # scan interval. If a progressive scan failed, last_scanned_len
+            # was reset above and the final scan covers the full response.
+            final_delta = accumulated_response[last_scanned_len:]
+            if Config.AIRS_ENABLED and final_delta:
                 try:
-                    from .security.airs_scanner import scan_output, log_security_violation
-
-                    final_scan_result = await scan_output(
-                        response=accumulated_response,
+                    final_scan_result = await airs_scanner.scan_output(
+                        response=final_delta,
                         profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME
                     )
 
                     if final_scan_result.action == "block":
-                        log_security_violation(
+                        airs_scanner.log_security_violation(
                             scan_type="output",
                             category=final_scan_result.category,
                             action="block",
                             profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME,
                             content=accumulated_response,
-                            conversation_id=self.conversation_id,
+                            conversation_id=conversation_id,
                             scan_context="final",
                             chunks_accumulated=content_chunk_count
                         )
 
                         # Record user input for audit
-                        self.conversation_history.append(HumanMessage(content=user_input))
+                        if use_history:
+                            self._append_history(HumanMessage(content=user_input))
 
-                        yield {
-                            "type": "security_violation",
-                            "message": "Response blocked due to content policy"
-                        }
+                        yield _SECURITY_VIOLATION_EVENT
                         return
 
                 except Exception as e:
-                    logger.error(f"AIRS final scan failed: {e}")
+                    logger.error("AIRS final scan failed: %s", e)
 
-            # 9. Update conversation history after streaming completes (only if not blocked)
-            self.conversation_history.append(HumanMessage(content=user_input))
-            self.conversation_history.append(AIMessage(content=accumulated_response))
+            # 5. Update conversation history after streaming completes (only if not blocked)
+            if use_history:
+                self._append_history(
+                    HumanMessage(content=user_input),
+                    AIMessage(content=accumulated_response)
+                )
 
-            logger.debug(f"Streaming complete: {accumulated_response}")
-            logger.debug(f"Total chunks streamed: {chunk_count}")
+            logger.debug("Streaming complete: %s", accumulated_response)
+            logger.debug("Total chunks streamed: %s", chunk_count)
 
         except Exception as e:
-            logger.error(f"Error streaming query: {e}")
+            logger.error("Error streaming query: %s", e)
             yield {
                 "type": "error",
                 "error": str(e)
             }
 
     def get_conversation_history(self) -> List[Dict[str, Any]]:
-        """Get conversation history in a serializable format."""
-        history = []
-        for i in range(0, len(self.conversation_history), 2):
-            if i + 1 < len(self.conversation_history):
-                user_msg = self.conversation_history[i]
-                assistant_msg = self.conversation_history[i + 1]
-                history.append({
-                    "user": user_msg.content,
-                    "assistant": assistant_msg.content
-                })
-        return history
+        """Get conversation history in a serializable format.
+
+        The serialized view is cached and only rebuilt when the underlying
+        history has grown, so repeated reads return without copying.
+        """
+        if (self._history_view_len != len(self.conversation_history)
+                or self._history_view_rev != self._history_revision):
+            history = []
+            for i in range(0, len(self.conversation_history), 2):
+                if i + 1 < len(self.conversation_history):
+                    user_msg = self.conversation_history[i]
+                    assistant_msg = self.conversation_history[i + 1]
+                    history.append({
+                        "user": user_msg.content,
+                        "assistant": assistant_msg.content
+                    })
+            self._history_view = history
+            self._history_view_len = len(self.conversation_history)
+            self._history_view_rev = self._history_revision
+        return self._history_view
 
     def clear_history(self) -> None:
         """Clear conversation history."""
         self.conversation_history = []
-        logger.info(f"Cleared conversation history for: {self.conversation_id}")
+        self._history_view = []
+        self._history_view_len = 0
+        self._history_revision += 1
+        self._history_view_rev = self._history_revision
+        logger.info("Cleared conversation history for: %s", self.conversation_id)
 
     @staticmethod
     async def process_stateless_query(user_input: str) -> str:
@@ -339,6 +813,8 @@ class ChatService:
 
         This is ideal for red teaming and batch testing scenarios where
         conversation history is not needed and memory usage should be minimized.
+        Identical queries already in flight are coalesced into a single
+        agent invocation and share its result.
 
         Args:
             user_input: The user's query to process
@@ -346,52 +822,53 @@ class ChatService:
         Returns:
             The assistant's response
         """
-        logger.info(f"Processing stateless query: {user_input}")
+        logger.info("Processing stateless query: %s", user_input)
 
-        try:
-            # 1. Retrieve context (mandatory RAG)
-            context = retrieve_context(user_input)
-            logger.debug(f"Retrieved context for stateless query: {user_input}")
-
-            # 2. Get LLM instance
-            llm = get_llm()
+        key = hashlib.blake2b(user_input.encode(), digest_size=16).hexdigest()
+        existing = _inflight.get(key)
+        if existing is not None:
+            logger.info("Coalescing duplicate in-flight stateless query")
+            return await existing
 
-            # 3. Get database tools
-            db_tools = get_database_tools(llm)
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        try:
+            response = await _get_stateless_service()._apipeline(user_input, use_history=False)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            _inflight.pop(key, None)
 
-            # 4. Get MCP tools (async)
-            mcp_tools = await get_mcp_tools()
+    @staticmethod
+    async def process_stateless_batch(user_inputs: List[str]) -> List[str]:
+        """Process a batch of stateless queries concurrently.
 
-            # 5. Combine all tools
-            tools = db_tools + mcp_tools
-            logger.info(f"Total tools available: {len(tools)} (DB: {len(db_tools)}, MCP: {len(mcp_tools)})")
+        Queries run through process_stateless_query under a shared semaphore,
+        so batch red-team runs scale with LLM backend concurrency instead of
+        serializing Python-side, while RED_TEAM_CONCURRENCY caps the fan-out.
+        Duplicate queries in the batch are coalesced by the in-flight dedup,
+        and with LLM_BATCHING_ENABLED the underlying calls are additionally
+        batched into shared provider requests.
 
-            # 6. Create React agent
-            react_agent = create_react_agent(
-                model=llm,
-                tools=tools
-            )
+        Args:
+            user_inputs: The queries to process
 
-            # 7. Prepare messages (no conversation history)
-            system_message = f"{Config.SYSTEM_PROMPT}\n\n{context}"
-            messages = [
-                SystemMessage(content=system_message),
-                HumanMessage(content=user_input)
-            ]
+        Returns:
+            Responses in the same order as the inputs
+        """
+        logger.info("Processing stateless batch of %d queries", len(user_inputs))
 
-            # 8. Get response from React agent
-            result = await react_agent.ainvoke(
-                {"messages": messages},
-                config={"callbacks": [ToolLoggingHandler()]}
-            )
-            response = result["messages"][-1].content
+        semaphore = asyncio.Semaphore(Config.RED_TEAM_CONCURRENCY)
 
-            logger.debug(f"Generated stateless response: {response[:100]}...")
-            return response
+        async def process_one(user_input: str) -> str:
+            async with semaphore:
+                return await ChatService.process_stateless_query(user_input)
 
-        except Exception as e:
-            logger.error(f"Error processing stateless query: {e}")
-            return "I apologize, but I encountered an error while processing your request. Please try again or contact our support team."
+        return list(await asyncio.gather(*[process_one(q) for q in user_inputs]))
 
     @staticmethod
     async def process_stateless_query_stream(user_input: str) -> AsyncIterator[Dict[str, Any]]:
@@ -406,201 +883,63 @@ class ChatService:
         Yields:
             Event dictionaries with streaming updates
         """
-        logger.info(f"Processing stateless streaming query: {user_input}")
-
-        try:
-            # 1. Retrieve context (mandatory RAG)
-            # Yield knowledge base search event
-            yield {
-                "type": "kb_search",
-                "message": "Searching knowledge base..."
-            }
-
-            context = retrieve_context(user_input)
-            logger.debug(f"Retrieved context for stateless streaming query: {user_input}")
-
-            # 2. Get LLM instance
-            llm = get_llm()
-
-            # 3. Get database tools
-            db_tools = get_database_tools(llm)
+        logger.info("Processing stateless streaming query: %s", user_input)
 
-            # 4. Get MCP tools (async)
-            mcp_tools = await get_mcp_tools()
-
-            # 5. Combine all tools
-            tools = db_tools + mcp_tools
-            logger.info(f"Total tools available for stateless streaming: {len(tools)} (DB: {len(db_tools)}, MCP: {len(mcp_tools)})")
-
-            # 6. Create React agent
-            react_agent = create_react_agent(
-                model=llm,
-                tools=tools
-            )
-
-            # 7. Prepare messages (no conversation history)
-            system_message = f"{Config.SYSTEM_PROMPT}\n\n{context}"
-            messages = [
-                SystemMessage(content=system_message),
-                HumanMessage(content=user_input)
-            ]
-
-            # 8. Stream response from React agent
-            accumulated_response = ""
-            chunk_count = 0
-            content_chunk_count = 0  # Track content chunks separately
+        async for event in _get_stateless_service()._apipeline_stream(user_input, use_history=False):
+            yield event
 
-            async for chunk in react_agent.astream(
-                {"messages": messages},
-                config={"callbacks": [ToolLoggingHandler()]},
-                stream_mode="messages"
-            ):
-                chunk_count += 1
-                # Chunk format with stream_mode="messages": (message, metadata)
-                if len(chunk) == 2:
-                    message, metadata = chunk
 
-                    # Handle AIMessage (agent response or tool calls)
-                    if isinstance(message, AIMessage):
-                        # Check for tool calls first
-                        if hasattr(message, 'tool_calls') and message.tool_calls and len(message.tool_calls) > 0:
-                            # Tool invocation - yield friendly description for UI
-                            for tool_call in message.tool_calls:
-                                tool_name = tool_call.get("name", "")
+@lru_cache(maxsize=1)
+def _get_stateless_service() -> ChatService:
+    """Get the shared history-less service behind the stateless entry points."""
+    return ChatService("stateless")
 
-                                # Skip empty tool names (streaming artifacts)
-                                if not tool_name:
-                                    continue
 
-                                # Get friendly description from tool definition
-                                tool_description = get_tool_description(tool_name, tools)
+class _ConversationStore(TTLCache):
+    """Bounded LRU + idle-TTL store for ChatService instances.
 
-                                yield {
-                                    "type": "tool_call",
-                                    "tool": tool_name,  # Keep for logging/debugging
-                                    "description": tool_description  # Use for customer-facing display
-                                }
-                        # Check for content (can have both tool_calls and content)
-                        if message.content:
-                            # Agent text response - yield token
-                            content_chunk = message.content
-                            accumulated_response += content_chunk
-                            content_chunk_count += 1
-
-                            yield {
-                                "type": "token",
-                                "content": content_chunk
-                            }
-
-                            # Progressive scanning every N chunks
-                            if content_chunk_count % Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL == 0 and Config.AIRS_ENABLED:
-                                try:
-                                    from .security.airs_scanner import scan_output, log_security_violation
-
-                                    scan_result = await scan_output(
-                                        response=accumulated_response,
-                                        profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME
-                                    )
-
-                                    if scan_result.action == "block":
-                                        # Log violation (stateless mode has no conversation_id)
-                                        log_security_violation(
-                                            scan_type="output",
-                                            category=scan_result.category,
-                                            action="block",
-                                            profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME,
-                                            content=accumulated_response,
-                                            conversation_id=None,
-                                            scan_context="progressive",
-                                            chunks_accumulated=content_chunk_count
-                                        )
-
-                                        # Yield security violation event
-                                        yield {
-                                            "type": "security_violation",
-                                            "message": "Response blocked due to content policy"
-                                        }
-
-                                        # Stop streaming immediately
-                                        return
-
-                                except Exception as e:
-                                    # Fail-open: log error and continue streaming
-                                    logger.error(f"AIRS scan failed during streaming: {e}")
-
-                    # Handle ToolMessage (tool results)
-                    elif isinstance(message, ToolMessage):
-                        yield {
-                            "type": "tool_result",
-                            "tool_call_id": message.tool_call_id,
-                            "result": message.content
-                        }
-
-            # Final scan after streaming completes (per Decision 5)
-            if Config.AIRS_ENABLED and accumulated_response:
-                try:
-                    from .security.airs_scanner import scan_output, log_security_violation
-
-                    final_scan_result = await scan_output(
-                        response=accumulated_response,
-                        profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME
-                    )
-
-                    if final_scan_result.action == "block":
-                        log_security_violation(
-                            scan_type="output",
-                            category=final_scan_result.category,
-                            action="block",
-                            profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME,
-                            content=accumulated_response,
-                            conversation_id=None,
-                            scan_context="final",
-                            chunks_accumulated=content_chunk_count
-                        )
-
-                        yield {
-                            "type": "security_violation",
-                            "message": "Response blocked due to content policy"
-                        }
-                        return
-
-                except Exception as e:
-                    logger.error(f"AIRS final scan failed: {e}")
-
-            logger.debug(f"Stateless streaming complete: {accumulated_response}")
-            logger.debug(f"Total chunks streamed: {chunk_count}")
+    An unbounded dict pins every conversation's history and agent in memory
+    forever; this caps the store and drops conversations idle past the TTL.
+    """
 
-        except Exception as e:
-            logger.error(f"Error processing stateless streaming query: {e}")
-            yield {
-                "type": "error",
-                "error": str(e)
-            }
+    def popitem(self):
+        conversation_id, chat_service = super().popitem()
+        logger.info("Evicted conversation from store: %s", conversation_id)
+        return conversation_id, chat_service
 
 
 # Global conversation store for API usage
-_conversations: Dict[str, ChatService] = {}
+_conversations: Dict[str, ChatService] = _ConversationStore(
+    maxsize=Config.CONVERSATION_CACHE_MAX_SIZE,
+    ttl=Config.CONVERSATION_CACHE_TTL_S
+)
+_conversations_lock = threading.Lock()
 
 
 def get_or_create_chat_service(conversation_id: str = "default") -> ChatService:
     """Get existing chat service or create new one."""
-    if conversation_id not in _conversations:
-        _conversations[conversation_id] = ChatService(conversation_id)
-    return _conversations[conversation_id]
+    with _conversations_lock:
+        if conversation_id not in _conversations:
+            _conversations[conversation_id] = ChatService(conversation_id)
+        return _conversations[conversation_id]
 
 
 def delete_conversation(conversation_id: str) -> bool:
     """Delete a conversation."""
-    if conversation_id in _conversations:
-        del _conversations[conversation_id]
-        logger.info(f"Deleted conversation: {conversation_id}")
-        return True
-    return False
+    with _conversations_lock:
+        if conversation_id in _conversations:
+            del _conversations[conversation_id]
+            logger.info("Deleted conversation: %s", conversation_id)
+            return True
+        return False
 
 
 def list_conversations() -> List[str]:
     """List all active conversation IDs."""
-    return list(_conversations.keys())
+    # Snapshot keys under the lock; build the result list outside it
+    with _conversations_lock:
+        keys = tuple(_conversations)
+    return list(keys)
 
 
 logger.info("Chat service initialized")
\ No newline at end of file
@@ -2,7 +2,6 @@
 
 import os
 import logging
-from functools import lru_cache
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -57,6 +56,18 @@ class Config:
     # AIRS Streaming Scan Configuration
     AIRS_STREAM_SCAN_CHUNK_INTERVAL = int(os.getenv("AIRS_STREAM_SCAN_CHUNK_INTERVAL", "50"))
 
+    # Skip the AIRS input scan for messages shorter than this many characters
+    # (0 scans everything); trivial inputs cannot carry a meaningful attack
+    # and each scan is an external HTTP round-trip
+    AIRS_MIN_SCAN_LEN = int(os.getenv("AIRS_MIN_SCAN_LEN", "0"))
+
+    # Overlap endpoint execution with the AIRS input scan to hide the scan
+    # round-trip behind the LLM call. Off by default: the endpoint can have
+    # side effects (DB tool writes, history appends) that cancelling on a
+    # late "block" verdict cannot undo, so scan-then-execute is the safe
+    # baseline
+    AIRS_SPECULATIVE_EXEC = os.getenv("AIRS_SPECULATIVE_EXEC", "false").lower() == "true"
+
     # Application Settings
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     KNOWLEDGE_BASE_PATH = os.getenv("KNOWLEDGE_BASE_PATH", "Vitos-Pizza-Cafe-KB")
@@ -69,6 +80,19 @@ For questions beyond the above scope, please inform the user that you can only p
 Use the following content as the knowledge you have learned, enclosed within <context></context> XML tags. When you need to reference the content in the context, please use the original text without any arbitrary modifications, including URL addresses, etc.
 When performing calculations, please make sure to write Python code and use the code-sandbox-mcp tool to ensure accuracy, no matter how simple the task may be."""
 
+    # RAG-as-Tool Configuration
+    # When enabled, the knowledge base is exposed to the agent as a
+    # search_knowledge_base tool instead of being retrieved on every query.
+    # Trivial queries (greetings, arithmetic) then skip retrieval entirely.
+    # Note: the data-poisoning demo relies on mandatory retrieval, so this
+    # stays off by default.
+    RAG_AS_TOOL_ENABLED = os.getenv("RAG_AS_TOOL_ENABLED", "false").lower() == "true"
+    if RAG_AS_TOOL_ENABLED:
+        SYSTEM_PROMPT = SYSTEM_PROMPT + (
+            "\nWhen you need company, menu, ordering, delivery, dining, or policy "
+            "information, call the search_knowledge_base tool to retrieve it before answering."
+        )
+
     # Model Configuration
     LLM_MODEL = os.getenv("LLM_MODEL", "gpt-5-mini")
     LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0"))
@@ -78,7 +102,57 @@ When performing calculations, please make sure to write Python code and use the
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
     RERANK_MODEL = os.getenv("RERANK_MODEL", "rerank-english-v3.0")
 
+    # Streaming Token Coalescing Configuration
+    # Streamed tokens are buffered and flushed as one SSE frame every
+    # STREAM_TOKEN_FLUSH_INTERVAL_S seconds or STREAM_TOKEN_FLUSH_MAX_CHARS
+    # characters, whichever comes first. Per-token SSE frames cost a socket
+    # write and a client-side parse each; the defaults trade up to 50ms of
+    # latency for roughly 10x fewer frames on fast token streams. Set the
+    # interval to 0 to flush every token.
+    STREAM_TOKEN_FLUSH_INTERVAL_S = float(os.getenv("STREAM_TOKEN_FLUSH_INTERVAL_S", "0.05"))
+    STREAM_TOKEN_FLUSH_MAX_CHARS = int(os.getenv("STREAM_TOKEN_FLUSH_MAX_CHARS", "256"))
+
+    # Conversation History Configuration
+    # Maximum number of past turns (user + assistant pairs) sent to the model.
+    # Stored history is trimmed to this window as well.
+    MAX_HISTORY_TURNS = int(os.getenv("MAX_HISTORY_TURNS", "10"))
+
+    # Conversation Store Configuration
+    CONVERSATION_CACHE_MAX_SIZE = int(os.getenv("CONVERSATION_CACHE_MAX_SIZE", "10000"))
+    CONVERSATION_CACHE_TTL_S = int(os.getenv("CONVERSATION_CACHE_TTL_S", "3600"))
+
+    # LLM Request Batching Configuration (stateless queries only)
+    LLM_BATCHING_ENABLED = os.getenv("LLM_BATCHING_ENABLED", "false").lower() == "true"
+    LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "16"))
+    LLM_BATCH_WAIT_TIMEOUT_S = float(os.getenv("LLM_BATCH_WAIT_TIMEOUT_S", "0.05"))
+
+    # Max concurrent agent invocations for batched stateless (red-team) runs
+    RED_TEAM_CONCURRENCY = int(os.getenv("RED_TEAM_CONCURRENCY", "8"))
+
+    # Semantic Response Cache Configuration
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+    SEMANTIC_CACHE_TTL_S = float(os.getenv("SEMANTIC_CACHE_TTL_S", "3600"))
+
+    # Speculative Prefill Configuration
+    # When enabled, non-streaming queries start an agent run without RAG
+    # context while retrieval is in flight; if the best match is farther
+    # than SPECULATIVE_MAX_DISTANCE (FAISS L2, lower is closer) the
+    # speculative run is committed, otherwise it is cancelled and the query
+    # runs again with context. Off by default: the security demos rely on
+    # retrieved context always being injected.
+    SPECULATIVE_PREFILL_ENABLED = os.getenv("SPECULATIVE_PREFILL_ENABLED", "false").lower() == "true"
+    SPECULATIVE_MAX_DISTANCE = float(os.getenv("SPECULATIVE_MAX_DISTANCE", "0.6"))
+
+    # Per-Conversation Context Cache Configuration
+    CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "false").lower() == "true"
+    CONTEXT_CACHE_FETCH_K = int(os.getenv("CONTEXT_CACHE_FETCH_K", "100"))
+    CONTEXT_CACHE_MIN_SIMILARITY = float(os.getenv("CONTEXT_CACHE_MIN_SIMILARITY", "0.5"))
+
     # RAG Configuration
+    # Workers in the dedicated thread pool for blocking vector-search calls
+    RAG_EXECUTOR_WORKERS = int(os.getenv("RAG_EXECUTOR_WORKERS", "4"))
     SIMILARITY_SEARCH_K = int(os.getenv("SIMILARITY_SEARCH_K", "5"))
     RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
@@ -130,14 +204,11 @@ When performing calculations, please make sure to write Python code and use the
     @classmethod
     def validate_required_vars(cls):
         """Validate that all required environment variables are set."""
-        required_vars = [
-            "OPENAI_API_KEY"
-        ]
-
-        missing_vars = [var for var in required_vars if not getattr(cls, var)]
-        if missing_vars:
+        # OPENAI_API_KEY is the only required variable; reference it directly
+        # rather than via a getattr loop so static checkers can see the access
+        if not cls.OPENAI_API_KEY:
             raise ValueError(
-                f"Missing required environment variables: {', '.join(missing_vars)}\n"
+                "Missing required environment variables: OPENAI_API_KEY\n"
                 "Please ensure you have created a .env file and configured all necessary API keys.\n"
                 "You can refer to the .env.example file for configuration."
             )
@@ -153,25 +224,44 @@ When performing calculations, please make sure to write Python code and use the
         os.environ["LANGSMITH_PROJECT"] = cls.LANGSMITH_PROJECT
 
     @classmethod
-    @lru_cache(maxsize=1)
     def setup_logging(cls):
-        """Configure logging for the application."""
-        logging.basicConfig(level=getattr(logging, cls.LOG_LEVEL))
+        """Configure logging for the application (idempotent)."""
+        return _setup_logging()
+
+
+# Module-level guards instead of lru_cache on classmethods: caching by cls
+# would pin the class in the cache and behave surprisingly under subclassing,
+# and a plain None check is cheaper than hashing cls per call.
+_logger = None
+_initialized_logger = None
+
+# Third-party loggers demoted to WARNING at setup; extend this tuple rather
+# than adding individual setLevel calls
+_NOISY_LOGGERS = ("httpx", "faiss", "langchain", "langgraph", "openai", "urllib3")
+
+
+def _setup_logging():
+    """Configure logging once and return the module logger."""
+    global _logger
+    if _logger is None:
+        logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
 
-        # Set third-party library log levels to WARNING
-        logging.getLogger("httpx").setLevel(logging.WARNING)
-        logging.getLogger("faiss").setLevel(logging.WARNING)
-        logging.getLogger("langchain").setLevel(logging.WARNING)
-        logging.getLogger("langgraph").setLevel(logging.WARNING)
+        # Set chatty third-party library log levels to WARNING; httpx and
+        # openai dominate the noise (one line per HTTP request otherwise)
+        for name in _NOISY_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
 
-        return logging.getLogger(__name__)
+        _logger = logging.getLogger(__name__)
+    return _logger
 
-@lru_cache(maxsize=1)
 def initialize_config():
     """Initialize configuration with validation and environment setup."""
-    Config.validate_required_vars()
-    Config.setup_environment()
-    return Config.setup_logging()
+    global _initialized_logger
+    if _initialized_logger is None:
+        Config.validate_required_vars()
+        Config.setup_environment()
+        _initialized_logger = Config.setup_logging()
+    return _initialized_logger
 
 # Get logger through lazy initialization
 def get_logger():
@@ -1,33 +1,129 @@
 """Database management for Vito's Pizza Cafe application."""
 
+import hashlib
+import os
+import re
 import sqlite3
 import logging
-from sqlalchemy import create_engine
-from sqlalchemy.pool import StaticPool
-from langchain_community.utilities.sql_database import SQLDatabase
-from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
 
 from .config import Config
 
+# sqlalchemy and langchain_community are imported lazily inside the functions
+# that need them: both pull in large transitive import trees, and deferring
+# them keeps cold start and test import time down until DB tools are used.
+
 logger = logging.getLogger(__name__)
 
+# Shared-cache in-memory database: every connection opened with this URI sees
+# the same pages, so the engine can hand out pooled reader connections instead
+# of serializing all SQL tool calls on one connection. A keeper connection
+# stays open for the process lifetime; SQLite drops the database when the
+# last shared-cache connection closes.
+_MEMORY_DB_URI = "file:vitos_customer_db?mode=memory&cache=shared"
+_keeper_connection = None
+
+
+def _connect_memory_db() -> sqlite3.Connection:
+    """Open a connection to the shared in-memory customer database."""
+    return sqlite3.connect(_MEMORY_DB_URI, uri=True, check_same_thread=False)
+
+
+def _load_snapshot_into_memory(cache_path: str) -> sqlite3.Connection:
+    """Load a snapshot file into the shared in-memory database via the backup API."""
+    source = sqlite3.connect(cache_path)
+    try:
+        connection = _connect_memory_db()
+        source.backup(connection)
+    finally:
+        source.close()
+    return connection
+
+
 def get_engine_for_customer_db(sql_file_path: str):
-    """Read the local SQL file content, fill the memory database, and create the engine."""
+    """Read the local SQL file content, fill the memory database, and create the engine.
+
+    The SQL script is only parsed and executed the first time it is seen;
+    the resulting database is snapshotted to a sidecar file with SQLite's
+    backup API, and later startups restore the snapshot with a page copy
+    instead of re-running every statement. The snapshot is invalidated by a
+    hash of the script contents.
+
+    The database lives in shared-cache memory (see _MEMORY_DB_URI), so the
+    returned engine uses a regular connection pool rather than pinning a
+    single connection.
+    """
+    global _keeper_connection
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import QueuePool
+
     try:
         # Read the local SQL file content
         with open(sql_file_path, "r", encoding="utf-8") as file:
             sql_script = file.read()
 
-        # Create a memory SQLite database connection
-        connection = sqlite3.connect(":memory:", check_same_thread=False)
-        connection.executescript(sql_script)
-
-        # Create SQLAlchemy engine
+        script_hash = hashlib.blake2b(sql_script.encode("utf-8"), digest_size=16).hexdigest()
+        cache_path = sql_file_path + ".cache.sqlite"
+        hash_path = cache_path + ".hash"
+
+        # Restore from the snapshot when it matches the current script
+        connection = None
+        if os.path.exists(cache_path) and os.path.exists(hash_path):
+            try:
+                with open(hash_path, "r", encoding="utf-8") as file:
+                    if file.read().strip() == script_hash:
+                        connection = _load_snapshot_into_memory(cache_path)
+                        logger.info(f"Database restored from snapshot {cache_path}")
+            except Exception as e:
+                # The snapshot is an optimization; fall back to the script
+                logger.warning(f"Database snapshot unusable, rebuilding from SQL: {e}")
+                connection = None
+
+        if connection is None:
+            # Create a memory SQLite database connection
+            connection = _connect_memory_db()
+
+            # Fast-load PRAGMAs: an in-memory, single-process database needs
+            # neither durable syncs nor a rollback journal, and a larger page
+            # cache (64MB) also helps the query workload after load
+            connection.executescript(
+                "PRAGMA synchronous=OFF;"
+                "PRAGMA journal_mode=MEMORY;"
+                "PRAGMA temp_store=MEMORY;"
+                "PRAGMA cache_size=-65536;"
+            )
+
+            # Run the dump in one transaction unless it manages its own;
+            # per-statement autocommit is the dominant cost for many INSERTs
+            if re.search(r"^\s*BEGIN\b", sql_script, re.IGNORECASE | re.MULTILINE):
+                connection.executescript(sql_script)
+            else:
+                connection.executescript(f"BEGIN;\n{sql_script}\nCOMMIT;")
+
+            # Persist a snapshot so the next startup skips the script replay
+            try:
+                snapshot = sqlite3.connect(cache_path)
+                try:
+                    connection.backup(snapshot)
+                finally:
+                    snapshot.close()
+                with open(hash_path, "w", encoding="utf-8") as file:
+                    file.write(script_hash)
+                logger.info(f"Database snapshot written to {cache_path}")
+            except Exception as e:
+                logger.warning(f"Failed to write database snapshot: {e}")
+
+        # Keep the loading connection open for the process lifetime so the
+        # shared-cache database survives; pooled connections come and go
+        _keeper_connection = connection
+
+        # Create SQLAlchemy engine with a real pool: each checkout gets its
+        # own connection to the shared-cache database, so concurrent SQL
+        # tool calls no longer serialize on a single sqlite connection
         engine = create_engine(
             "sqlite://",
-            creator=lambda: connection,
-            poolclass=StaticPool,
-            connect_args={"check_same_thread": False},
+            creator=_connect_memory_db,
+            poolclass=QueuePool,
         )
 
         logger.info(f"Database loaded successfully from {sql_file_path}")
@@ -42,9 +138,18 @@ def get_engine_for_customer_db(sql_file_path: str):
 
 _db_engine = None
 
+# Tools cached per LLM instance, keyed by id(llm). get_llm() is lru_cached,
+# so the id is stable for the process lifetime; the cache avoids re-running
+# SQLAlchemy schema reflection on every chat turn.
+_db_tools_cache = {}
+
 def get_database_tools(llm):
     """Get database tools, initializing once and reusing the engine.
 
+    The SQLDatabase wrapper and SQLDatabaseToolkit re-introspect the schema
+    when constructed, so the resulting tools are cached per LLM instance and
+    reused across requests.
+
     Args:
         llm: Language model instance to use for database operations
 
@@ -53,6 +158,13 @@ def get_database_tools(llm):
     """
     global _db_engine
 
+    from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+    cached = _db_tools_cache.get(id(llm))
+    if cached is not None:
+        return cached
+
     # Initialize database engine once (singleton pattern)
     if _db_engine is None:
         _db_engine = get_engine_for_customer_db(Config.DATABASE_PATH)
@@ -65,5 +177,19 @@ def get_database_tools(llm):
     toolkit = SQLDatabaseToolkit(db=db, llm=llm)
     tools = toolkit.get_tools()
 
+    _db_tools_cache[id(llm)] = tools
     logger.info(f"Database tools initialized: {len(tools)} tools available")
-    return tools
\ No newline at end of file
+    return tools
+
+def reset_database_tools():
+    """Clear the cached engine and tools (mainly for tests)."""
+    global _db_engine, _keeper_connection
+    if _db_engine is not None:
+        _db_engine.dispose()
+    _db_engine = None
+    if _keeper_connection is not None:
+        # Closing the last shared-cache connection destroys the in-memory
+        # database, so the next initialization starts from a clean slate
+        _keeper_connection.close()
+        _keeper_connection = None
+    _db_tools_cache.clear()
\ No newline at end of file
@@ -58,6 +58,15 @@ def chunk_documents(documents) -> List[str]:
     logger.info(f"Total chunks after chunking: {len(chunks)}")
     return chunks
 
+@lru_cache(maxsize=1)
+def get_embeddings() -> OpenAIEmbeddings:
+    """Get cached embeddings client shared by the knowledge base and other callers."""
+    return OpenAIEmbeddings(
+        model=Config.EMBEDDING_MODEL,
+        api_key=Config.OPENAI_EMBEDDING_API_KEY,
+        base_url=Config.OPENAI_EMBEDDING_BASE_URL
+    )
+
 @lru_cache(maxsize=1)
 def setup_knowledge_base(directory_path: str = None) -> FAISS:
     """Process markdown documents and create a vector store."""
@@ -65,11 +74,7 @@ def setup_knowledge_base(directory_path: str = None) -> FAISS:
         directory_path = Config.KNOWLEDGE_BASE_PATH
 
     index_file_path = os.path.join(directory_path, "faiss_index")
-    embeddings = OpenAIEmbeddings(
-        model=Config.EMBEDDING_MODEL,
-        api_key=Config.OPENAI_EMBEDDING_API_KEY,
-        base_url=Config.OPENAI_EMBEDDING_BASE_URL
-    )
+    embeddings = get_embeddings()
 
     if os.path.exists(index_file_path):
         logger.info("Loading existing index...")
@@ -93,8 +98,92 @@ def get_vector_store() -> FAISS:
     """Get cached vector store."""
     return setup_knowledge_base()
 
-def retrieve_context(user_query: str) -> str:
-    """Retrieve relevant context from the vector store for a user query."""
+class LocalContextCache:
+    """Per-conversation cache of an oversized retrieval result.
+
+    On a miss, one index query fetches CONTEXT_CACHE_FETCH_K documents along
+    with their embeddings. Subsequent queries in the same conversation are
+    answered from that local subset with a numpy dot product, and the index
+    is only re-queried when the best local similarity falls below
+    CONTEXT_CACHE_MIN_SIMILARITY. Conversations tend to stay on topic, so
+    most turns after the first skip the full retrieval entirely.
+
+    Disabled by default; enable with CONTEXT_CACHE_ENABLED=true.
+    """
+
+    def __init__(self):
+        self._doc_texts: List[str] = []
+        self._doc_vectors = None  # normalized (n_docs, dim) matrix
+
+    @staticmethod
+    def _embed_query(user_query: str):
+        """Embed a query, normalized so dot products are cosine similarities."""
+        import numpy as np
+
+        vector = np.asarray(get_embeddings().embed_query(user_query), dtype="float32")
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def retrieve(self, user_query: str) -> str:
+        """Retrieve context for a query, preferring the local cached subset."""
+        import numpy as np
+
+        query_vector = self._embed_query(user_query)
+
+        if self._doc_vectors is None or (
+            float(np.max(self._doc_vectors @ query_vector)) < Config.CONTEXT_CACHE_MIN_SIMILARITY
+        ):
+            self._refill(query_vector)
+
+        if self._doc_vectors is None:
+            logger.warning("No relevant context found from the knowledge base")
+            return "<context>\nNo relevant context found from the knowledge base.\n</context>"
+
+        scores = self._doc_vectors @ query_vector
+        top_indices = np.argsort(scores)[::-1][:Config.RERANK_TOP_N]
+        context_content = "\n".join(self._doc_texts[i] for i in top_indices)
+        return f"<context>\n{context_content}\n</context>"
+
+    def _refill(self, query_vector):
+        """Fetch an oversized document set (with embeddings) from the index."""
+        import numpy as np
+
+        vector_store = get_vector_store()
+        k = min(Config.CONTEXT_CACHE_FETCH_K, vector_store.index.ntotal)
+        if k == 0:
+            return
+
+        _, indices = vector_store.index.search(query_vector.reshape(1, -1), k)
+
+        texts = []
+        vectors = []
+        for idx in indices[0]:
+            if idx < 0:
+                continue
+            doc_id = vector_store.index_to_docstore_id[int(idx)]
+            doc = vector_store.docstore.search(doc_id)
+            vector = np.asarray(vector_store.index.reconstruct(int(idx)), dtype="float32")
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+            texts.append(doc.page_content)
+            vectors.append(vector)
+
+        if vectors:
+            self._doc_texts = texts
+            self._doc_vectors = np.vstack(vectors)
+            logger.info(f"Local context cache refilled with {len(texts)} documents")
+
+
+def retrieve_context_with_score(user_query: str):
+    """Retrieve context plus the best FAISS distance for a user query.
+
+    Returns:
+        Tuple of (context string, best L2 distance or None when no match).
+        Lower distances mean closer matches.
+    """
     logger.debug(f"Retrieving context for query: {user_query}")
 
     # Get vector store
@@ -112,7 +201,7 @@ def retrieve_context(user_query: str) -> str:
     # If no documents, return empty context
     if not docs_with_scores:
         logger.warning("No relevant context found from the knowledge base")
-        return "<context>\nNo relevant context found from the knowledge base.\n</context>"
+        return "<context>\nNo relevant context found from the knowledge base.\n</context>", None
 
     # Take top N documents based on similarity scores (no reranking)
     reranked_docs = filtered_docs[:Config.RERANK_TOP_N]
@@ -121,4 +210,10 @@ def retrieve_context(user_query: str) -> str:
     context_message = f"<context>\n{context_content}\n</context>"
 
     logger.debug(f"Retrieved {len(reranked_docs)} relevant documents")
-    return context_message
\ No newline at end of file
+    return context_message, float(docs_with_scores[0][1])
+
+
+def retrieve_context(user_query: str) -> str:
+    """Retrieve relevant context from the vector store for a user query."""
+    context, _ = retrieve_context_with_score(user_query)
+    return context
\ No newline at end of file
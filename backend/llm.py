@@ -2,12 +2,20 @@
 
 import logging
 from functools import lru_cache
+
+import httpx
 from langchain_openai import ChatOpenAI
 
 from .config import Config
 
 logger = logging.getLogger(__name__)
 
+# Connection pool sized for concurrent chat traffic; the httpx defaults
+# bottleneck parallel requests on a small pool. Shared by the cached LLM
+# instance so keep-alive connections stay warm across requests.
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_HTTP_TIMEOUT = httpx.Timeout(60.0)
+
 
 @lru_cache(maxsize=1)
 def get_llm():
@@ -23,6 +31,8 @@ def get_llm():
         max_tokens=None,
         timeout=None,
         max_retries=Config.LLM_MAX_RETRIES,
+        http_client=httpx.Client(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT),
+        http_async_client=httpx.AsyncClient(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT),
     )
 
     logger.info(f"LLM initialized: {Config.LLM_MODEL} at {Config.OPENAI_BASE_URL}")
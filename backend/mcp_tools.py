@@ -1,49 +1,89 @@
 """MCP tool integration for Vito's Pizza Cafe application."""
 
+import asyncio
 import logging
-from typing import List
+import re
+import string
+from typing import List, Optional
 from langchain_mcp_adapters.client import MultiServerMCPClient
 
 from .config import Config
 
 logger = logging.getLogger(__name__)
 
+# Tool list fetched once per process; every call re-opened SSE/stdio
+# connections to each configured server and refetched tool schemas otherwise.
+# The lock serializes the first fetch under concurrent requests.
+_mcp_tools_cache: Optional[List] = None
+_mcp_lock = asyncio.Lock()
 
-async def fix_tool_schema(tools: List) -> List:
-    """Fix schema issues for MCP tools that don't comply with OpenAI API requirements.
+# Characters outside the OpenAI-compatible tool name pattern ^[a-zA-Z0-9_-]{1,128}$
+_INVALID_TOOL_NAME_CHARS = re.compile(r"[^A-Za-z0-9_-]")
+
+# Fast validity check: deleting every allowed character must leave nothing.
+# str.translate with a precomputed table is a single C-level pass, so the
+# common all-valid case skips the regex machinery entirely.
+_ALLOWED_DELETE_TBL = str.maketrans("", "", string.ascii_letters + string.digits + "_-")
+
+
+def _tool_name_is_valid(name: str) -> bool:
+    """Check a tool name against ^[a-zA-Z0-9_-]{1,128}$ without regex."""
+    return len(name) <= 128 and not name.translate(_ALLOWED_DELETE_TBL)
+
+
+def _fix_sandbox_exec_schema(tool) -> None:
+    """Fix schema issues for a tool that doesn't comply with OpenAI API requirements.
 
     Specifically fixes:
     - code-sandbox-mcp's sandbox_exec tool: Missing 'items' definition in array properties
 
     Args:
-        tools: List of tools from MCP servers
-
-    Returns:
-        List of tools with fixed schemas
+        tool: The sandbox_exec tool, or None when it is not configured
     """
-    for tool in tools:
-        # Fix sandbox_exec tool schema
-        if tool.name == "sandbox_exec":
-            if "commands" in tool.args_schema.get("properties", {}):
-                commands_prop = tool.args_schema["properties"]["commands"]
-                if commands_prop.get("type") == "array" and "items" not in commands_prop:
-                    # Add missing items definition for array
-                    commands_prop["items"] = {"type": "string"}
-                    logger.info(f"Fixed schema for tool: {tool.name} (added items definition to commands array)")
+    if tool is None:
+        return
 
-    return tools
+    commands_prop = tool.args_schema.get("properties", {}).get("commands")
+    if commands_prop is not None and commands_prop.get("type") == "array" and "items" not in commands_prop:
+        # Add missing items definition for array
+        commands_prop["items"] = {"type": "string"}
+        logger.info("Fixed schema for tool: %s (added items definition to commands array)", tool.name)
 
 
 async def get_mcp_tools() -> List:
-    """Get MCP tools from configured servers.
+    """Get MCP tools from configured servers, cached after the first fetch.
 
     Returns:
         list: MCP tools from all configured servers
     """
+    global _mcp_tools_cache
+
+    if _mcp_tools_cache is not None:
+        return _mcp_tools_cache
+
     if not Config.MCP_SERVERS:
         logger.info("No MCP servers configured, returning empty tool list")
         return []
 
+    async with _mcp_lock:
+        # Another request may have populated the cache while we waited
+        if _mcp_tools_cache is not None:
+            return _mcp_tools_cache
+        return await _fetch_mcp_tools()
+
+
+async def refresh_mcp_tools() -> List:
+    """Drop the cached tool list and refetch from the configured servers."""
+    global _mcp_tools_cache
+    async with _mcp_lock:
+        _mcp_tools_cache = None
+    return await get_mcp_tools()
+
+
+async def _fetch_mcp_tools() -> List:
+    """Fetch, fix, and sanitize tools from the MCP servers (uncached)."""
+    global _mcp_tools_cache
+
     try:
         # Initialize MCP client with configured servers
         client = MultiServerMCPClient(Config.MCP_SERVERS)
@@ -51,22 +91,30 @@ async def get_mcp_tools() -> List:
         # Get tools asynchronously
         tools = await client.get_tools()
 
-        # Fix tool schemas for OpenAI API compatibility
-        tools = await fix_tool_schema(tools)
-
-        # Sanitize tool names to comply with OpenAI-compatible API requirements
+        # Single pass: sanitize names and index tools by name, so per-tool
+        # schema patches below are O(1) lookups instead of linear scans
+        #
+        # Name sanitization complies with OpenAI-compatible API requirements
         # Pattern requirement: ^[a-zA-Z0-9_-]{1,128}$
-        # Replace colons with underscores (e.g., "None:maps_geo" -> "None_maps_geo")
-        # Normally there's no need to do that, but there's a bug in the current pan-mcp-relay implementation
+        # Replace any disallowed character with an underscore (e.g.,
+        # "None:maps_geo" -> "None_maps_geo", a known pan-mcp-relay bug) and
+        # cap the length; conforming names skip the rewrite entirely
+        tools_by_name = {}
         for tool in tools:
-            if ':' in tool.name:
+            if not _tool_name_is_valid(tool.name):
                 original_name = tool.name
-                tool.name = tool.name.replace(':', '_')
-                logger.info(f"Sanitized tool name: {original_name} -> {tool.name}")
+                tool.name = _INVALID_TOOL_NAME_CHARS.sub('_', tool.name)[:128]
+                logger.info("Sanitized tool name: %s -> %s", original_name, tool.name)
+            tools_by_name[tool.name] = tool
+
+        # Fix tool schemas for OpenAI API compatibility
+        _fix_sandbox_exec_schema(tools_by_name.get("sandbox_exec"))
 
-        logger.info(f"MCP tools initialized: {len(tools)} tools available")
+        logger.info("MCP tools initialized: %d tools available", len(tools))
+        _mcp_tools_cache = tools
         return tools
 
     except Exception as e:
-        logger.error(f"Error initializing MCP tools: {e}")
+        # Not cached, so the next call retries the handshake
+        logger.error("Error initializing MCP tools: %s", e)
         return []
@@ -5,6 +5,7 @@ Provides decorator-based prompt scanning using Palo Alto Networks Prisma AIRS.
 Uses decorator pattern for minimal code intrusion and clean separation of concerns.
 """
 
+import asyncio
 import logging
 from dataclasses import dataclass
 from functools import lru_cache, wraps
@@ -14,6 +15,16 @@ from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
+# SDK model classes hoisted out of the hot scan paths so each scan call skips
+# the import machinery; None when the SDK is unavailable, mirroring the
+# fail-open guard in get_scanner()
+try:
+    from aisecurity.generated_openapi_client.models.ai_profile import AiProfile
+    from aisecurity.scan.models.content import Content
+except ImportError:
+    AiProfile = None
+    Content = None
+
 
 @dataclass
 class ScanResult:
@@ -52,13 +63,23 @@ def get_scanner():
         return scanner
 
     except ImportError as e:
-        logger.error(f"Failed to import AIRS SDK: {e}")
+        logger.error("Failed to import AIRS SDK: %s", e)
         return None
     except Exception as e:
-        logger.error(f"Failed to initialize AIRS Scanner: {e}")
+        logger.error("Failed to initialize AIRS Scanner: %s", e)
         return None
 
 
+@lru_cache(maxsize=8)
+def _get_ai_profile(profile_name: str):
+    """Get a cached AiProfile for a profile name.
+
+    Profile names are effectively two Config constants, so memoizing the
+    objects removes repeated OpenAPI model validation from the scan paths.
+    """
+    return AiProfile(profile_name=profile_name)
+
+
 async def scan_input(prompt: str, profile_name: str) -> ScanResult:
     """
     Scan user input for security threats.
@@ -71,24 +92,21 @@ async def scan_input(prompt: str, profile_name: str) -> ScanResult:
         ScanResult with action (allow/block) and details
     """
     scanner = get_scanner()
-    if not scanner:
+    if not scanner or AiProfile is None:
         # Scanner not initialized, allow by default (fail-open for availability)
         return ScanResult(action="allow")
 
     try:
-        from aisecurity.generated_openapi_client.models.ai_profile import AiProfile
-        from aisecurity.scan.models.content import Content
-
-        ai_profile = AiProfile(profile_name=profile_name)
+        ai_profile = _get_ai_profile(profile_name)
         scan_response = await scanner.sync_scan(
             ai_profile=ai_profile,
             content=Content(prompt=prompt)
         )
 
-        action = scan_response.action if hasattr(scan_response, 'action') else "allow"
-        category = scan_response.category if hasattr(scan_response, 'category') else None
+        action = getattr(scan_response, 'action', 'allow')
+        category = getattr(scan_response, 'category', None)
 
-        logger.info(f"Input scan result: action={action}, category={category}")
+        logger.info("Input scan result: action=%s, category=%s", action, category)
 
         return ScanResult(
             action=action,
@@ -97,7 +115,7 @@ async def scan_input(prompt: str, profile_name: str) -> ScanResult:
         )
 
     except Exception as e:
-        logger.error(f"AIRS input scan failed: {e}", exc_info=True)
+        logger.error("AIRS input scan failed: %s", e, exc_info=True)
         # Fail-open: allow request to proceed if scanner fails
         return ScanResult(action="allow")
 
@@ -114,24 +132,21 @@ async def scan_output(response: str, profile_name: str) -> ScanResult:
         ScanResult with action (allow/block) and details
     """
     scanner = get_scanner()
-    if not scanner:
+    if not scanner or AiProfile is None:
         # Scanner not initialized, allow by default
         return ScanResult(action="allow")
 
     try:
-        from aisecurity.generated_openapi_client.models.ai_profile import AiProfile
-        from aisecurity.scan.models.content import Content
-
-        ai_profile = AiProfile(profile_name=profile_name)
+        ai_profile = _get_ai_profile(profile_name)
         scan_response = await scanner.sync_scan(
             ai_profile=ai_profile,
             content=Content(response=response)
         )
 
-        action = scan_response.action if hasattr(scan_response, 'action') else "allow"
-        category = scan_response.category if hasattr(scan_response, 'category') else None
+        action = getattr(scan_response, 'action', 'allow')
+        category = getattr(scan_response, 'category', None)
 
-        logger.info(f"Output scan result: action={action}, category={category}")
+        logger.info("Output scan result: action=%s, category=%s", action, category)
 
         return ScanResult(
             action=action,
@@ -140,7 +155,7 @@ async def scan_output(response: str, profile_name: str) -> ScanResult:
         )
 
     except Exception as e:
-        logger.error(f"AIRS output scan failed: {e}", exc_info=True)
+        logger.error("AIRS output scan failed: %s", e, exc_info=True)
         # Fail-open: allow response to proceed if scanner fails
         return ScanResult(action="allow")
 
@@ -172,26 +187,52 @@ def log_security_violation(
         scan_context: Optional context for streaming scans ("progressive" or "final")
         chunks_accumulated: Optional count of chunks accumulated when scan was performed
     """
-    log_parts = [
-        f"AIRS Security Violation - ",
-        f"scan_type={scan_type}, "
-    ]
+    # %-style lazy formatting: nothing is materialized when the record is
+    # filtered, which matters for bursts of blocks on long responses
+    log_parts = ["AIRS Security Violation - scan_type=%s, "]
+    log_args = [scan_type]
 
     if scan_context:
-        log_parts.append(f"scan_context={scan_context}, ")
+        log_parts.append("scan_context=%s, ")
+        log_args.append(scan_context)
 
     if chunks_accumulated is not None:
-        log_parts.append(f"chunks_accumulated={chunks_accumulated}, ")
+        log_parts.append("chunks_accumulated=%d, ")
+        log_args.append(chunks_accumulated)
+
+    log_parts.append("category=%s, action=%s, profile=%s, conversation_id=%s, content_length=%d")
+    log_args.extend([category, action, profile_name, conversation_id, len(content)])
+
+    logger.warning("".join(log_parts), *log_args)
 
-    log_parts.extend([
-        f"category={category}, ",
-        f"action={action}, ",
-        f"profile={profile_name}, ",
-        f"conversation_id={conversation_id}, ",
-        f"content_length={len(content)}"
-    ])
 
-    logger.warning("".join(log_parts))
+async def _scan_response_output(request, response):
+    """Run the AIRS output scan on an endpoint response, raising 403 on block."""
+    from backend.config import Config
+
+    output_result = await scan_output(
+        response=response.response,
+        profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME
+    )
+
+    if output_result.action == "block":
+        # Log detailed security violation for monitoring (NOT shown to user)
+        log_security_violation(
+            scan_type="output",
+            category=output_result.category,
+            action="block",
+            profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME,
+            content=response.response,
+            conversation_id=getattr(request, 'conversation_id', None)
+        )
+
+        # Return sanitized error message to user (no security details)
+        raise HTTPException(
+            status_code=403,
+            detail="The response couldn't be displayed due to our content policy. Please try a different question."
+        )
+
+    return response
 
 
 def scan_with_airs(func: Callable) -> Callable:
@@ -204,6 +245,12 @@ def scan_with_airs(func: Callable) -> Callable:
 
     Raises HTTPException(403) if either scan blocks the request/response.
 
+    By default the endpoint only runs after the input scan allows the
+    prompt. With AIRS_SPECULATIVE_EXEC=true the endpoint is started in
+    parallel with the input scan to hide the scan round-trip; a "block"
+    then cancels the endpoint task, but side effects it performed before
+    the verdict arrived (DB tool writes, history appends) are not undone.
+
     Usage:
         @app.post("/api/v1/chat")
         @scan_with_airs
@@ -214,17 +261,54 @@ def scan_with_airs(func: Callable) -> Callable:
     async def wrapper(request, *args, **kwargs):
         from backend.config import Config
 
+        # Empty or whitespace-only messages are rejected regardless of
+        # whether AIRS is enabled - input validation shouldn't depend on
+        # scanner configuration
+        message = (request.message or "").strip()
+        if not message:
+            raise HTTPException(
+                status_code=400,
+                detail="Message cannot be empty."
+            )
+
         # Skip scanning if AIRS not enabled
         if not Config.AIRS_ENABLED:
             return await func(request, *args, **kwargs)
 
-        # Input scan - check user prompt before processing
-        input_result = await scan_input(
-            prompt=request.message,
-            profile_name=Config.X_PAN_INPUT_CHECK_PROFILE_NAME
-        )
+        # Messages below the configured threshold skip the (vacuous) input
+        # scan entirely
+        if len(message) < Config.AIRS_MIN_SCAN_LEN:
+            response = await func(request, *args, **kwargs)
+            return await _scan_response_output(request, response)
+
+        # Input scan - check user prompt before processing. By default the
+        # endpoint waits for the verdict, so a blocked prompt never executes.
+        # With AIRS_SPECULATIVE_EXEC the endpoint runs in parallel: most
+        # legitimate scans return "allow", so the AIRS round-trip hides
+        # behind the LLM call, at the cost that a blocked prompt may perform
+        # side effects before the cancel lands.
+        func_task = None
+        if Config.AIRS_SPECULATIVE_EXEC:
+            input_task = asyncio.create_task(scan_input(
+                prompt=request.message,
+                profile_name=Config.X_PAN_INPUT_CHECK_PROFILE_NAME
+            ))
+            func_task = asyncio.create_task(func(request, *args, **kwargs))
+            input_result = await input_task
+        else:
+            input_result = await scan_input(
+                prompt=request.message,
+                profile_name=Config.X_PAN_INPUT_CHECK_PROFILE_NAME
+            )
 
         if input_result.action == "block":
+            if func_task is not None:
+                func_task.cancel()
+                try:
+                    await func_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
             # Log detailed security violation for monitoring (NOT shown to user)
             log_security_violation(
                 scan_type="input",
@@ -241,32 +325,9 @@ def scan_with_airs(func: Callable) -> Callable:
                 detail="Your request couldn't be processed due to our content policy. Please rephrase your message and try again."
             )
 
-        # Execute original endpoint
-        response = await func(request, *args, **kwargs)
-
-        # Output scan - check AI response before returning
-        output_result = await scan_output(
-            response=response.response,
-            profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME
-        )
-
-        if output_result.action == "block":
-            # Log detailed security violation for monitoring (NOT shown to user)
-            log_security_violation(
-                scan_type="output",
-                category=output_result.category,
-                action="block",
-                profile_name=Config.X_PAN_OUTPUT_CHECK_PROFILE_NAME,
-                content=response.response,
-                conversation_id=getattr(request, 'conversation_id', None)
-            )
-
-            # Return sanitized error message to user (no security details)
-            raise HTTPException(
-                status_code=403,
-                detail="The response couldn't be displayed due to our content policy. Please try a different question."
-            )
-
-        return response
+        # Collect the endpoint result, then run the output scan before
+        # returning
+        response = await func_task if func_task is not None else await func(request, *args, **kwargs)
+        return await _scan_response_output(request, response)
 
     return wrapper
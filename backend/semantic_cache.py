@@ -0,0 +1,136 @@
+"""Semantic cache for RAG context and final responses."""
+
+import hashlib
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from .config import Config
+from .knowledge_base import get_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    """A cached (context, response) pair for one query embedding."""
+
+    __slots__ = ("prefix_hash", "context", "response", "ts", "hits")
+
+    def __init__(self, prefix_hash: str, context: str, response: str):
+        self.prefix_hash = prefix_hash
+        self.context = context
+        self.response = response
+        self.ts = time.monotonic()
+        self.hits = 0
+
+
+class SemanticCache:
+    """Semantic cache of (query, context, response) keyed by query embedding.
+
+    A full hit replaces the entire RAG + React agent + LLM round-trip with
+    an in-process vector lookup, so semantically repeated questions are
+    answered in sub-millisecond time. Responses are scoped to a hash of the
+    conversation history, so a cached answer is only reused when the
+    surrounding conversation context matches; when only the history differs,
+    the cached RAG context is still returned as a partial hit, skipping the
+    retrieval step. Entries expire after a TTL and the oldest half is
+    evicted when the cache is full.
+
+    Disabled by default; enable with SEMANTIC_CACHE_ENABLED=true.
+    """
+
+    def __init__(self, threshold: float = None, max_entries: int = None, ttl_s: float = None):
+        self.threshold = threshold if threshold is not None else Config.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries if max_entries is not None else Config.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ttl_s = ttl_s if ttl_s is not None else Config.SEMANTIC_CACHE_TTL_S
+        self._index = None  # faiss.IndexFlatIP, created lazily on first add
+        self._entries: List[_CacheEntry] = []  # parallel to index rows
+        # The singleton is shared between the request event loop and the
+        # background-loop thread that drives sync process_query, so index
+        # and entry mutations must stay atomic relative to lookups
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _embed(text: str):
+        """Embed text with the shared KB embedder, normalized for cosine similarity."""
+        import numpy as np
+
+        vector = np.asarray(get_embeddings().embed_query(text), dtype="float32")
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.reshape(1, -1)
+
+    @staticmethod
+    def prefix_hash(history: List) -> str:
+        """Hash the conversation history so cached responses stay context-specific."""
+        hasher = hashlib.blake2b(digest_size=16)
+        for message in history:
+            hasher.update(str(message.content).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def get(self, query: str, prefix_hash: str = "") -> Optional[Tuple[str, Optional[str]]]:
+        """Look up a semantically similar query.
+
+        Returns:
+            (context, response) on a full hit, (context, None) on a partial
+            hit where only the conversation history differs, or None on a
+            miss or expired entry.
+        """
+        if self._index is None or not self._entries:
+            return None
+
+        # Embedding happens outside the lock (it is the slow part and touches
+        # no shared state); the search and entry access stay under it so a
+        # concurrent add/eviction cannot desync index rows from entries
+        vector = self._embed(query)
+        with self._lock:
+            if self._index is None or not self._entries:
+                return None
+
+            scores, indices = self._index.search(vector, 1)
+            score, idx = float(scores[0][0]), int(indices[0][0])
+            if idx < 0 or score < self.threshold:
+                return None
+
+            entry = self._entries[idx]
+            if time.monotonic() - entry.ts > self.ttl_s:
+                return None
+
+            entry.hits += 1
+            if entry.prefix_hash != prefix_hash:
+                logger.info("Semantic cache partial hit (similarity=%.3f, hits=%d)", score, entry.hits)
+                return entry.context, None
+
+            logger.info("Semantic cache hit (similarity=%.3f, hits=%d)", score, entry.hits)
+            return entry.context, entry.response
+
+    def add(self, query: str, context: str, response: str, prefix_hash: str = "") -> None:
+        """Cache a (query, context, response) entry, evicting the oldest half when full."""
+        import faiss
+
+        vector = self._embed(query)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexFlatIP(vector.shape[1])
+
+            if len(self._entries) >= self.max_entries:
+                # Eviction is rare at this size, so a rebuild keeps the code simple
+                keep_from = self.max_entries // 2
+                kept_vectors = self._index.reconstruct_n(keep_from, self._index.ntotal - keep_from)
+                rebuilt = faiss.IndexFlatIP(vector.shape[1])
+                rebuilt.add(kept_vectors)
+                self._index = rebuilt
+                self._entries = self._entries[keep_from:]
+                logger.info("Semantic cache evicted oldest %d entries", keep_from)
+
+            self._index.add(vector)
+            self._entries.append(_CacheEntry(prefix_hash, context, response))
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache:
+    """Get the shared semantic cache instance."""
+    return SemanticCache()
@@ -252,7 +252,8 @@ async function sendMessageStream() {
             if (done) break;
 
             buffer += decoder.decode(value, {stream: true});
-            const messages = buffer.split('\n\n');
+            // The SSE spec allows LF or CRLF line endings; sse-starlette emits CRLF
+            const messages = buffer.split(/\r?\n\r?\n/);
             buffer = messages.pop(); // Keep incomplete message in buffer
 
             for (const msg of messages) {
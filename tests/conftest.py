@@ -0,0 +1,14 @@
+"""Shared pytest configuration for the test suite."""
+
+
+def pytest_configure(config):
+    """Register custom markers used to split offline and live test runs."""
+    config.addinivalue_line(
+        "markers", "local: offline tests that mock external services (run per commit)"
+    )
+    config.addinivalue_line(
+        "markers", "remote: tests that hit live external services (run nightly/on demand)"
+    )
+    config.addinivalue_line(
+        "markers", "slow: long-running cases skippable locally with -m 'not slow'"
+    )
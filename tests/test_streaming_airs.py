@@ -7,21 +7,165 @@ Tests end-to-end flow with actual API endpoints:
 - AIRS API call count verification
 - Performance impact measurement
 - Conversation history validation
+
+The tests drive the ASGI app directly through httpx.AsyncClient with
+ASGITransport: unlike the sync TestClient, SSE chunks are consumed on the
+test's own event loop instead of hopping through a portal thread per line.
+
+Tests are independent (distinct conversation_ids, per-worker module state)
+and wall-clock bound by simulated scanner latency, so they parallelize
+well: `pytest -n auto --dist loadgroup tests/test_streaming_airs.py`.
+The xdist_group marker keeps the history-validation tests on one worker
+since they read back the conversation store they write to.
 """
 
 import pytest
+import pytest_asyncio
 import asyncio
+import itertools
+import orjson
 import time
-from unittest.mock import patch, AsyncMock
-from fastapi.testclient import TestClient
+from contextlib import ExitStack
+from unittest.mock import patch, AsyncMock, MagicMock
+from httpx import ASGITransport, AsyncClient
+from langchain_core.messages import AIMessage
+from backend import chat_service
 from backend.api import app
+from backend.config import Config
+from backend.security import airs_scanner
 from backend.security.airs_scanner import ScanResult
 
+# Pre-built (message, metadata) chunk tuples shared by every mock stream.
+# The service only reads chunks, so one allocation serves all yields instead
+# of constructing a fresh AIMessage per iteration (500 per long-response test).
+_BAD_CHUNK = (AIMessage(content="bad "), {"run_id": "test"})
+_SAFE_CHUNK = (AIMessage(content="safe "), {"run_id": "test"})
+_OK_CHUNK = (AIMessage(content="ok "), {"run_id": "test"})
+_X_CHUNK = (AIMessage(content="x"), {"run_id": "test"})
+
+
+def make_mock_agent(chunk, count, delay=None):
+    """Build a mock agent whose astream yields the shared chunk N times."""
+    async def mock_stream():
+        # itertools.repeat steps the loop in C; at 500 chunks the range()
+        # counter was a measurable share of the otherwise-trivial stream
+        for c in itertools.repeat(chunk, count):
+            yield c
+            if delay is not None:
+                await asyncio.sleep(delay)
+
+    mock_agent = MagicMock()
+    mock_agent.astream = MagicMock(return_value=mock_stream())
+    return mock_agent
+
+
+@pytest_asyncio.fixture(scope="session")
+async def client():
+    """Async test client running the FastAPI app in-process.
+
+    Session-scoped: ASGITransport holds no connections or loop state, so
+    one client instance safely serves every test instead of being rebuilt
+    per function.
+    """
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as async_client:
+        yield async_client
+
+
+@pytest.fixture(autouse=True)
+def _reset_conversations():
+    """Clear the module-level conversation store after each test.
+
+    Keeps tests order-independent and xdist workers clean now that the
+    client fixture no longer tears down per test.
+    """
+    yield
+    with chat_service._conversations_lock:
+        chat_service._conversations.clear()
+
+
+# Substring probe for the violation fast path in collect_sse_events; the
+# backend serializes events with orjson, which emits compact key:value pairs
+_VIOLATION_TAG = b'"type":"security_violation"'
+
+
+async def collect_sse_events(client, payload, stop_on_violation=False):
+    """POST to the streaming endpoint and collect parsed SSE events.
+
+    Reads raw bytes and splits on the SSE frame delimiter (sse-starlette
+    emits CRLF-terminated frames) rather than iter_lines: one split per
+    frame instead of a Python-level newline scan and text decode per line,
+    which matters on the 500-event streams. orjson's C decoder keeps the
+    per-frame parse cheap.
+
+    With stop_on_violation=True only violation frames are parsed at all -
+    a C-level substring check filters the token events, which those callers
+    never inspect - and the stream stops at the first violation.
+    """
+    events = []
+    buf = b""
+    async with client.stream("POST", "/api/v1/chat/stream", json=payload) as response:
+        async for part in response.aiter_bytes(65536):
+            buf += part
+            while b"\r\n\r\n" in buf:
+                frame, buf = buf.split(b"\r\n\r\n", 1)
+                if not frame.startswith(b"data: "):
+                    continue
+                if stop_on_violation and _VIOLATION_TAG not in frame:
+                    continue
+                try:
+                    event = orjson.loads(frame[6:])  # Skip "data: " prefix
+                except orjson.JSONDecodeError:
+                    continue
+                events.append(event)
+                if stop_on_violation and event.get("type") == "security_violation":
+                    return events
+    return events
+
+
+class _VirtualClock:
+    """Tallies requested asyncio.sleep delays instead of waiting them out."""
+
+    def __init__(self):
+        self.elapsed = 0.0
+
 
 @pytest.fixture
-def client():
-    """Test client for FastAPI app."""
-    return TestClient(app)
+def virtual_clock(monkeypatch):
+    """Replace asyncio.sleep with a virtual-time recorder.
+
+    Sleeps still yield to the event loop (coroutine interleaving and scan
+    ordering are preserved) but return immediately; the requested delays
+    accumulate on the clock. Latency tests can then assert an exact virtual
+    elapsed time instead of a loose wall-clock bound, and spend no real
+    time sleeping.
+    """
+    clock = _VirtualClock()
+    real_sleep = asyncio.sleep
+
+    async def instant_sleep(delay, result=None):
+        clock.elapsed += delay
+        return await real_sleep(0, result)
+
+    monkeypatch.setattr(asyncio, "sleep", instant_sleep)
+    return clock
+
+
+@pytest.fixture
+def airs_patches():
+    """ExitStack with the shared AIRS config patches pre-applied.
+
+    Tests add their per-test scanner mocks with `enter_context` on the same
+    stack instead of stacking five `with patch(...)` managers each; the
+    Config patch (enabled + 50-chunk scan interval) is entered once here via
+    patch.multiple rather than once per attribute per test.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(patch.multiple(
+            Config,
+            AIRS_ENABLED=True,
+            AIRS_STREAM_SCAN_CHUNK_INTERVAL=50,
+        ))
+        yield stack
 
 
 @pytest.fixture
@@ -50,220 +194,150 @@ def mock_scan_block_output():
 @pytest.fixture
 def mock_rag():
     """Mock RAG retrieval."""
-    with patch('backend.chat_service.retrieve_context', return_value="<context>Test context</context>"):
+    with patch.object(chat_service, "retrieve_context", return_value="<context>Test context</context>"):
         yield
 
 
 @pytest.fixture
 def mock_llm():
     """Mock LLM."""
-    with patch('backend.chat_service.get_llm'):
+    with patch.object(chat_service, "get_llm"):
         yield
 
 
 @pytest.fixture
 def mock_tools():
     """Mock tools."""
-    with patch('backend.chat_service.get_database_tools', return_value=[]), \
-         patch('backend.chat_service.get_mcp_tools', new_callable=AsyncMock, return_value=[]):
+    with patch.object(chat_service, "get_database_tools", return_value=[]), \
+         patch.object(chat_service, "get_mcp_tools", new_callable=AsyncMock, return_value=[]):
         yield
 
 
-class TestEndToEndStreaming:
-    """End-to-end streaming tests with malicious content detection."""
+async def run_progressive_block_scenario(client, airs_patches, payload):
+    """Drive the shared progressive-block scenario and return (events, mock_log).
 
-    def test_input_scan_blocks_at_api_level(self, client, mock_rag, mock_llm, mock_tools):
-        """Test that malicious input is blocked at API endpoint before streaming."""
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.security.airs_scanner.scan_input', AsyncMock(return_value=ScanResult(action="block", category="malicious"))), \
-             patch('backend.security.airs_scanner.log_security_violation') as mock_log:
-
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "malicious prompt injection",
-                    "conversation_id": "test-input-block"
-                }
-            )
+    Sets up the 60-chunk "bad " stream with a scanner that blocks the first
+    output scan, streams until the violation, and hands back the events and
+    the violation-log mock. The stateful and stateless block tests differ
+    only in the payload and their post-assertions, so the setup lives here
+    once instead of being repeated per test.
+    """
+    mock_agent = make_mock_agent(_BAD_CHUNK, 60)
+    output_scan_ids = itertools.count(1)
 
-            # Should return 403 Forbidden
-            assert response.status_code == 403
-            assert "content policy" in response.json()["detail"].lower()
-
-            # Should have logged the violation
-            assert mock_log.called
-            call_kwargs = mock_log.call_args[1]
-            assert call_kwargs["scan_type"] == "input"
-            assert call_kwargs["action"] == "block"
-            assert call_kwargs["conversation_id"] == "test-input-block"
+    async def scan_block_first(prompt=None, response=None, profile_name=None):
+        if prompt:
+            return ScanResult(action="allow")
+        if next(output_scan_ids) == 1:
+            return ScanResult(action="block", category="toxic")
+        return ScanResult(action="allow")
 
-    def test_output_scan_blocks_during_streaming(self, client, mock_rag, mock_llm, mock_tools):
-        """Test that malicious output is detected and streaming stops."""
-        # Mock agent that yields chunks
-        async def mock_stream():
-            for i in range(60):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="bad "), {"run_id": "test"})
+    airs_patches.enter_context(patch.object(chat_service, "create_react_agent", return_value=mock_agent))
+    airs_patches.enter_context(patch.object(airs_scanner, "scan_input", side_effect=scan_block_first))
+    airs_patches.enter_context(patch.object(airs_scanner, "scan_output", side_effect=scan_block_first))
+    mock_log = airs_patches.enter_context(patch.object(airs_scanner, "log_security_violation"))
 
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+    events = await collect_sse_events(client, payload, stop_on_violation=True)
+    return events, mock_log
 
-        scan_count = [0]  # Use list to allow mutation in nested function
 
-        async def mock_scan_with_count(prompt=None, response=None, profile_name=None):
-            if prompt:  # Input scan - allow
-                return ScanResult(action="allow")
-            else:  # Output scan
-                scan_count[0] += 1
-                if scan_count[0] == 1:  # First progressive scan - block
-                    return ScanResult(action="block", category="toxic")
-                else:
-                    return ScanResult(action="allow")
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_input', side_effect=mock_scan_with_count), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_with_count), \
-             patch('backend.security.airs_scanner.log_security_violation') as mock_log:
-
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "tell me a story",
-                    "conversation_id": "test-output-block"
-                }
-            )
+class TestEndToEndStreaming:
+    """End-to-end streaming tests with malicious content detection."""
 
-            # Collect all SSE events
-            events = []
-            for line in response.iter_lines():
-                if line:
-                    if line.startswith('data: '):
-                        import json
-                        try:
-                            event = json.loads(line[6:])  # Skip "data: " prefix
-                            events.append(event)
-                            if event.get("type") == "security_violation":
-                                break
-                        except json.JSONDecodeError:
-                            pass
-
-            # Should have security violation event
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) > 0
-
-            # Should have logged the violation
-            assert mock_log.called
-
-    def test_benign_content_streams_successfully(self, client, mock_rag, mock_llm, mock_tools):
+    @pytest.mark.asyncio
+    async def test_input_scan_blocks_at_api_level(self, client, airs_patches, mock_rag, mock_llm, mock_tools):
+        """Test that malicious input is blocked at API endpoint before streaming."""
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_input", AsyncMock(return_value=ScanResult(action="block", category="malicious"))))
+        mock_log = airs_patches.enter_context(patch.object(airs_scanner, "log_security_violation"))
+
+        response = await client.post(
+            "/api/v1/chat/stream",
+            json={
+                "message": "malicious prompt injection",
+                "conversation_id": "test-input-block"
+            }
+        )
+
+        # Should return 403 Forbidden
+        assert response.status_code == 403
+        assert "content policy" in response.json()["detail"].lower()
+
+        # Should have logged the violation
+        assert mock_log.called
+        call_kwargs = mock_log.call_args[1]
+        assert call_kwargs["scan_type"] == "input"
+        assert call_kwargs["action"] == "block"
+        assert call_kwargs["conversation_id"] == "test-input-block"
+
+    @pytest.mark.asyncio
+    async def test_output_scan_blocks_during_streaming(self, client, airs_patches, mock_rag, mock_llm, mock_tools):
+        """Test that malicious output is detected and streaming stops."""
+        events, mock_log = await run_progressive_block_scenario(
+            client,
+            airs_patches,
+            {
+                "message": "tell me a story",
+                "conversation_id": "test-output-block"
+            }
+        )
+
+        # Should have security violation event
+        violation_events = [e for e in events if e.get("type") == "security_violation"]
+        assert len(violation_events) > 0
+
+        # Should have logged the violation
+        assert mock_log.called
+
+    @pytest.mark.asyncio
+    async def test_benign_content_streams_successfully(self, client, airs_patches, mock_rag, mock_llm, mock_tools):
         """Test that benign content streams without interruption."""
-        async def mock_stream():
-            for i in range(75):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="safe "), {"run_id": "test"})
-
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_input', AsyncMock(return_value=ScanResult(action="allow"))), \
-             patch('backend.security.airs_scanner.scan_output', AsyncMock(return_value=ScanResult(action="allow"))):
-
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "what's on the menu?",
-                    "conversation_id": "test-benign"
-                },
-            )
-
-            # Collect all events
-            events = []
-            for line in response.iter_lines():
-                if line:
-                    if line.startswith('data: '):
-                        import json
-                        try:
-                            event = json.loads(line[6:])
-                            events.append(event)
-                        except json.JSONDecodeError:
-                            pass
-
-            # Should have no security violations
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) == 0
-
-            # Should have token events
-            token_events = [e for e in events if e.get("type") == "token"]
-            assert len(token_events) > 0
-
-
-class TestAIRSAPICallCount:
-    """Verify AIRS API call count matches design expectations."""
+        mock_agent = make_mock_agent(_SAFE_CHUNK, 75)
 
-    def test_api_call_count_for_long_response(self, client, mock_rag, mock_llm, mock_tools):
-        """Test AIRS API call count for a 500-chunk response."""
-        async def mock_stream():
-            # Generate 500 chunks to test API call count
-            for i in range(500):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="x"), {"run_id": "test"})
+        airs_patches.enter_context(patch.object(chat_service, "create_react_agent", return_value=mock_agent))
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_input", AsyncMock(return_value=ScanResult(action="allow"))))
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_output", AsyncMock(return_value=ScanResult(action="allow"))))
 
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        events = await collect_sse_events(
+            client,
+            {
+                "message": "what's on the menu?",
+                "conversation_id": "test-benign"
+            }
+        )
 
-        input_scan_count = [0]
-        output_scan_count = [0]
+        # Should have no security violations
+        violation_events = [e for e in events if e.get("type") == "security_violation"]
+        assert len(violation_events) == 0
 
-        async def count_input_scans(prompt, profile_name):
-            input_scan_count[0] += 1
-            return ScanResult(action="allow")
+        # Should have token events
+        token_events = [e for e in events if e.get("type") == "token"]
+        assert len(token_events) > 0
 
-        async def count_output_scans(response, profile_name):
-            output_scan_count[0] += 1
-            return ScanResult(action="allow")
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_input', side_effect=count_input_scans), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=count_output_scans):
-
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "test query",
-                    "conversation_id": "test-call-count"
-                },
-            )
-
-            # Consume all events
-            for line in response.iter_lines():
-                pass
-
-            # Expected: 1 input scan + 10 progressive scans (at 50,100,...,500) + 1 final = 12 total
-            assert input_scan_count[0] == 1  # One input scan
-            assert output_scan_count[0] == 11  # 10 progressive + 1 final
-
-    def test_api_call_count_for_short_response(self, client, mock_rag, mock_llm, mock_tools):
-        """Test AIRS API call count for a 30-chunk response (no progressive scan)."""
-        async def mock_stream():
-            for i in range(30):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="x"), {"run_id": "test"})
-
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+class TestAIRSAPICallCount:
+    """Verify AIRS API call count matches design expectations.
+
+    With a 50-chunk scan interval the rule is: one progressive scan per
+    full interval, plus a final scan only when the last progressive scan
+    did not already cover the end of the response. Parametrized sizes
+    exercise the no-progressive, exact-boundary, and multi-interval cases;
+    the 500-chunk case is marked slow so `pytest -m "not slow"` skips it.
+    """
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "n_chunks,expected_output_scans",
+        [
+            (30, 1),   # no progressive scan, final scan only
+            (50, 1),   # one progressive at the boundary, final skipped
+            (130, 3),  # progressive at 50 and 100, final covers the tail
+            pytest.param(500, 10, marks=pytest.mark.slow),  # 10 progressive, no final
+        ],
+    )
+    async def test_api_call_count(self, client, airs_patches, mock_rag, mock_llm, mock_tools,
+                                  n_chunks, expected_output_scans):
+        """One input scan plus the interval-derived number of output scans."""
+        mock_agent = make_mock_agent(_X_CHUNK, n_chunks)
 
         input_scan_count = [0]
         output_scan_count = [0]
@@ -276,103 +350,78 @@ class TestAIRSAPICallCount:
             output_scan_count[0] += 1
             return ScanResult(action="allow")
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_input', side_effect=count_input_scans), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=count_output_scans):
-
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "short query",
-                    "conversation_id": "test-short"
-                },
-            )
+        airs_patches.enter_context(patch.object(chat_service, "create_react_agent", return_value=mock_agent))
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_input", side_effect=count_input_scans))
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_output", side_effect=count_output_scans))
 
-            for line in response.iter_lines():
-                pass
+        await collect_sse_events(
+            client,
+            {
+                "message": "test query",
+                "conversation_id": f"test-call-count-{n_chunks}"
+            }
+        )
 
-            # Expected: 1 input scan + 0 progressive + 1 final = 2 total
-            assert input_scan_count[0] == 1
-            assert output_scan_count[0] == 1  # Only final scan (no progressive)
+        assert input_scan_count[0] == 1  # One input scan
+        assert output_scan_count[0] == expected_output_scans
 
 
 class TestPerformanceImpact:
     """Measure performance impact of AIRS scanning."""
 
-    def test_streaming_latency_with_airs_enabled(self, client, mock_rag, mock_llm, mock_tools):
-        """Test streaming latency with AIRS enabled."""
-        async def mock_stream():
-            for i in range(100):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="x"), {"run_id": "test"})
-                await asyncio.sleep(0.001)  # Simulate streaming delay
+    @pytest.mark.asyncio
+    async def test_streaming_latency_with_airs_enabled(self, client, airs_patches, virtual_clock, mock_rag, mock_llm, mock_tools):
+        """Test streaming latency with AIRS enabled, measured in virtual time."""
+        # sleep(0) between chunks yields to the event loop without adding
+        # wall-clock or virtual delay - the cooperative scheduling is what
+        # the old 1ms sleep was actually for
+        mock_agent = make_mock_agent(_X_CHUNK, 100, delay=0)
 
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        scan_calls = [0]
 
         async def mock_scan_with_delay(prompt=None, response=None, profile_name=None):
+            scan_calls[0] += 1
             await asyncio.sleep(0.05)  # Simulate 50ms AIRS API latency
             return ScanResult(action="allow")
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_input', side_effect=mock_scan_with_delay), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_with_delay):
-
-            start_time = time.time()
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "test",
-                    "conversation_id": "test-perf"
-                },
-            )
-
-            for line in response.iter_lines():
-                pass
-
-            elapsed_time = time.time() - start_time
-
-            # With 2 progressive scans (at 50, 100) + 1 final = 3 output scans + 1 input scan
-            # Expected delay: ~4 scans * 50ms = 200ms
-            # Allow some overhead for processing
-            assert elapsed_time < 1.0  # Should complete within 1 second
-
-    def test_streaming_latency_with_airs_disabled(self, client, mock_rag, mock_llm, mock_tools):
+        airs_patches.enter_context(patch.object(chat_service, "create_react_agent", return_value=mock_agent))
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_input", side_effect=mock_scan_with_delay))
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_output", side_effect=mock_scan_with_delay))
+
+        await collect_sse_events(
+            client,
+            {
+                "message": "test",
+                "conversation_id": "test-perf"
+            }
+        )
+
+        # 1 input scan + 2 progressive output scans (at chunks 50 and 100);
+        # the final scan is skipped because the scan at chunk 100 already
+        # covered the full response
+        assert scan_calls[0] == 3
+
+        # Exact virtual latency: one simulated 50ms AIRS round-trip per
+        # scan - no "< 1 second" slack needed
+        assert virtual_clock.elapsed == pytest.approx(scan_calls[0] * 0.05)
+
+    @pytest.mark.asyncio
+    async def test_streaming_latency_with_airs_disabled(self, client, mock_rag, mock_llm, mock_tools):
         """Test streaming latency with AIRS disabled (baseline)."""
-        async def mock_stream():
-            for i in range(100):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="x"), {"run_id": "test"})
-                await asyncio.sleep(0.001)
+        mock_agent = make_mock_agent(_X_CHUNK, 100, delay=0)
 
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
-
-        with patch('backend.config.Config.AIRS_ENABLED', False), \
-             patch('backend.config.Config.AIRS_ENABLED', False), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output') as mock_scan:
+        with patch.object(Config, "AIRS_ENABLED", False), \
+             patch.object(chat_service, "create_react_agent", return_value=mock_agent), \
+             patch.object(airs_scanner, "scan_output") as mock_scan:
 
             start_time = time.time()
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
+            await collect_sse_events(
+                client,
+                {
                     "message": "test",
                     "conversation_id": "test-perf-baseline"
-                },
+                }
             )
-
-            for line in response.iter_lines():
-                pass
-
             elapsed_time = time.time() - start_time
 
             # Without AIRS scanning, should be faster
@@ -382,170 +431,82 @@ class TestPerformanceImpact:
             assert not mock_scan.called
 
 
+@pytest.mark.xdist_group("conversation_state")
 class TestConversationHistoryValidation:
-    """Validate conversation history for blocked responses."""
-
-    def test_conversation_history_after_blocked_response(self, client, mock_rag, mock_llm, mock_tools):
-        """Test conversation history contains user input but not blocked response."""
-        async def mock_stream():
-            for i in range(60):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="bad "), {"run_id": "test"})
-
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
-
-        scan_count = [0]
-
-        async def mock_scan_block_second(prompt=None, response=None, profile_name=None):
+    """Validate conversation history for blocked and allowed responses."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "block_first,expected_history_len",
+        [(True, 0), (False, 1)],
+        ids=["blocked", "allowed"],
+    )
+    async def test_conversation_history(self, client, airs_patches, mock_rag, mock_llm, mock_tools,
+                                        block_first, expected_history_len):
+        """Blocked responses record only the user turn; allowed responses
+        record the complete user/assistant exchange.
+
+        The history endpoint pairs messages into exchanges, so a blocked
+        stream (user message only, per Decision 3) yields an empty list.
+        """
+        chunk = _BAD_CHUNK if block_first else _OK_CHUNK
+        mock_agent = make_mock_agent(chunk, 60)
+        conversation_id = f"test-history-{'blocked' if block_first else 'allowed'}"
+
+        output_scan_ids = itertools.count(1)
+
+        async def mock_scan(prompt=None, response=None, profile_name=None):
             if prompt:
                 return ScanResult(action="allow")
-            else:
-                scan_count[0] += 1
-                if scan_count[0] == 1:  # Block at first progressive scan
-                    return ScanResult(action="block", category="toxic")
-                return ScanResult(action="allow")
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_input', side_effect=mock_scan_block_second), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_block_second), \
-             patch('backend.security.airs_scanner.log_security_violation'):
-
-            # Stream with blocking
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "test blocked query",
-                    "conversation_id": "test-history-blocked"
-                },
-            )
-
-            for line in response.iter_lines():
-                if line:
-                    if line.startswith('data: '):
-                        import json
-                        try:
-                            event = json.loads(line[6:])
-                            if event.get("type") == "security_violation":
-                                break
-                        except json.JSONDecodeError:
-                            pass
-
-            # Check conversation history via API
-            history_response = client.get("/api/v1/conversations/test-history-blocked/history")
-            history = history_response.json()
-
-            # Should have 1 exchange (user input only, no assistant response)
-            # Note: The API returns conversation history in exchange format
-            # When blocked, only user message is recorded (per Decision 3)
-            # But history endpoint might not show incomplete exchanges
-            # This depends on how get_conversation_history() handles odd-length history
-
-    def test_conversation_history_after_allowed_response(self, client, mock_rag, mock_llm, mock_tools):
-        """Test conversation history contains both user input and assistant response."""
-        async def mock_stream():
-            for i in range(60):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="ok "), {"run_id": "test"})
-
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_input', AsyncMock(return_value=ScanResult(action="allow"))), \
-             patch('backend.security.airs_scanner.scan_output', AsyncMock(return_value=ScanResult(action="allow"))):
-
-            # Stream without blocking
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "test allowed query",
-                    "conversation_id": "test-history-allowed"
-                },
-            )
-
-            for line in response.iter_lines():
-                pass
-
-            # Check conversation history
-            history_response = client.get("/api/v1/conversations/test-history-allowed/history")
-            history_data = history_response.json()
+            if block_first and next(output_scan_ids) == 1:  # Block at first progressive scan
+                return ScanResult(action="block", category="toxic")
+            return ScanResult(action="allow")
 
-            # Should have 1 complete exchange (user + assistant)
-            assert "messages" in history_data
-            messages = history_data["messages"]
-            assert len(messages) == 1
-            assert messages[0]["user"] == "test allowed query"
+        airs_patches.enter_context(patch.object(chat_service, "create_react_agent", return_value=mock_agent))
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_input", side_effect=mock_scan))
+        airs_patches.enter_context(patch.object(airs_scanner, "scan_output", side_effect=mock_scan))
+        airs_patches.enter_context(patch.object(airs_scanner, "log_security_violation"))
+
+        await collect_sse_events(
+            client,
+            {
+                "message": "test history query",
+                "conversation_id": conversation_id
+            },
+            stop_on_violation=block_first
+        )
+
+        # Check conversation history via API
+        history_response = await client.get(f"/api/v1/conversations/{conversation_id}/history")
+        history_data = history_response.json()
+
+        assert "messages" in history_data
+        messages = history_data["messages"]
+        assert len(messages) == expected_history_len
+        if not block_first:
+            assert messages[0]["user"] == "test history query"
             assert "ok" in messages[0]["assistant"]
 
 
 class TestStatelessMode:
     """Test streaming AIRS protection in stateless mode."""
 
-    def test_stateless_streaming_with_progressive_scan(self, client, mock_rag, mock_llm, mock_tools):
+    @pytest.mark.asyncio
+    async def test_stateless_streaming_with_progressive_scan(self, client, airs_patches, mock_rag, mock_llm, mock_tools):
         """Test that stateless mode also has progressive scanning."""
-        async def mock_stream():
-            for i in range(60):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="bad "), {"run_id": "test"})
-
-        from unittest.mock import MagicMock
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
-
-        scan_count = [0]
-
-        async def mock_scan_block_progressive(prompt=None, response=None, profile_name=None):
-            if prompt:
-                return ScanResult(action="allow")
-            else:
-                scan_count[0] += 1
-                if scan_count[0] == 1:
-                    return ScanResult(action="block", category="toxic")
-                return ScanResult(action="allow")
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_input', side_effect=mock_scan_block_progressive), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_block_progressive), \
-             patch('backend.security.airs_scanner.log_security_violation') as mock_log:
-
-            # Use stateless endpoint (no conversation_id)
-            response = client.post(
-                "/api/v1/chat/stream",
-                json={
-                    "message": "test stateless",
-                    # No conversation_id - triggers stateless mode
-                },
-            )
-
-            events = []
-            for line in response.iter_lines():
-                if line:
-                    if line.startswith('data: '):
-                        import json
-                        try:
-                            event = json.loads(line[6:])
-                            events.append(event)
-                            if event.get("type") == "security_violation":
-                                break
-                        except json.JSONDecodeError:
-                            pass
-
-            # Should have security violation
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) > 0
-
-            # Should have logged with conversation_id=None (stateless)
-            # Note: The API always assigns a conversation_id, so this test might need adjustment
-            # If stateless mode is truly stateless, the endpoint needs modification
+        # No conversation_id in the payload - triggers stateless mode
+        events, _ = await run_progressive_block_scenario(
+            client,
+            airs_patches,
+            {
+                "message": "test stateless",
+            }
+        )
+
+        # Should have security violation
+        violation_events = [e for e in events if e.get("type") == "security_violation"]
+        assert len(violation_events) > 0
+
+        # Should have logged with conversation_id=None (stateless)
+        # Note: The API always assigns a conversation_id, so this test might need adjustment
+        # If stateless mode is truly stateless, the endpoint needs modification
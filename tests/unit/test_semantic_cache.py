@@ -0,0 +1,112 @@
+"""
+Offline unit tests for the semantic cache.
+
+The KB embedder is mocked with fixed unit vectors so similarity between
+queries is controlled exactly; faiss itself runs for real, keeping the
+index/entries bookkeeping under test.
+
+Usage:
+    pytest tests/unit/test_semantic_cache.py
+    pytest -m local
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from backend.semantic_cache import SemanticCache
+
+pytestmark = pytest.mark.local
+
+# Fixed embeddings: basis vectors are mutually orthogonal (similarity 0.0),
+# and the "paraphrase" query sits at ~0.99 similarity to the menu query
+_VECTORS = {
+    "what pizzas do you have": [1.0, 0.0, 0.0, 0.0],
+    "which pizzas are on the menu": [0.99, 0.14, 0.0, 0.0],
+    "do you deliver": [0.0, 1.0, 0.0, 0.0],
+    "what are your hours": [0.0, 0.0, 1.0, 0.0],
+    "do you sell gift cards": [0.0, 0.0, 0.0, 1.0],
+}
+
+
+def _mock_embeddings():
+    """Patch the KB embedder with the fixed vector table above."""
+    embeddings = SimpleNamespace(embed_query=lambda text: _VECTORS[text])
+    return patch('backend.semantic_cache.get_embeddings', return_value=embeddings)
+
+
+class TestSemanticCache:
+    """Tests for SemanticCache get/add semantics with mocked embeddings."""
+
+    def test_full_hit_returns_context_and_response(self):
+        """A semantically similar query with matching history is a full hit."""
+        with _mock_embeddings():
+            cache = SemanticCache(threshold=0.92, max_entries=10, ttl_s=60)
+            cache.add("what pizzas do you have", "menu context", "We have margherita.",
+                      prefix_hash="abc")
+
+            result = cache.get("which pizzas are on the menu", prefix_hash="abc")
+
+        assert result == ("menu context", "We have margherita.")
+
+    def test_dissimilar_query_misses(self):
+        """A query below the similarity threshold returns None."""
+        with _mock_embeddings():
+            cache = SemanticCache(threshold=0.92, max_entries=10, ttl_s=60)
+            cache.add("what pizzas do you have", "menu context", "We have margherita.")
+
+            assert cache.get("do you deliver") is None
+
+    def test_prefix_mismatch_is_partial_hit(self):
+        """Different conversation history reuses the context but not the response."""
+        with _mock_embeddings():
+            cache = SemanticCache(threshold=0.92, max_entries=10, ttl_s=60)
+            cache.add("what pizzas do you have", "menu context", "We have margherita.",
+                      prefix_hash="abc")
+
+            result = cache.get("what pizzas do you have", prefix_hash="other")
+
+        assert result == ("menu context", None)
+
+    def test_expired_entry_misses(self):
+        """An entry past its TTL is treated as a miss."""
+        with _mock_embeddings():
+            cache = SemanticCache(threshold=0.92, max_entries=10, ttl_s=0.01)
+            cache.add("what pizzas do you have", "menu context", "We have margherita.")
+            time.sleep(0.05)
+
+            assert cache.get("what pizzas do you have") is None
+
+    def test_eviction_drops_oldest_half(self):
+        """Filling the cache evicts the oldest half and keeps index/entries in sync."""
+        queries = [
+            "what pizzas do you have",
+            "do you deliver",
+            "what are your hours",
+            "do you sell gift cards",
+        ]
+        with _mock_embeddings():
+            cache = SemanticCache(threshold=0.92, max_entries=4, ttl_s=60)
+            for i, query in enumerate(queries[:3]):
+                cache.add(query, f"context {i}", f"response {i}")
+
+            cache.add(queries[3], "context 3", "response 3")
+
+            assert len(cache._entries) == 4
+            assert cache._index.ntotal == 4
+
+            # The fifth add finds the cache full and evicts the oldest half
+            cache.add("which pizzas are on the menu", "context 4", "response 4")
+
+            # Oldest half (entries 0 and 1) is gone; newer entries still resolve
+            assert len(cache._entries) == 3
+            assert cache._index.ntotal == 3
+            assert cache.get("do you deliver") is None
+            assert cache.get("what are your hours") == ("context 2", "response 2")
+            assert cache.get("do you sell gift cards") == ("context 3", "response 3")
@@ -8,24 +8,205 @@ Tests cover:
 - Security violation event handling
 - Fail-open behavior
 - Conversation history handling
+
+The test classes share no mutable module state (all patching is
+per-test), so they are safe to spread across pytest-xdist workers with
+`pytest tests/unit/test_streaming_airs.py -n auto --dist loadscope`
+(loadscope assigns whole classes to workers, which the class-scoped
+chat_service fixture requires). Worker startup outweighs the gain for
+this file alone; it pays off in full-suite runs.
 """
 
+import asyncio
+
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
+import uvloop
+from collections import Counter
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from langchain_core.messages import AIMessage, HumanMessage
 from backend.chat_service import ChatService
 from backend.security.airs_scanner import ScanResult
 
+# Pre-built (message, metadata) chunk tuples shared by every mock stream.
+# The streaming pipeline only reads .content, so yielding the same tuple
+# is safe and skips a Pydantic AIMessage construction per chunk.
+_RUN_META = {"run_id": "test"}
+_OK_CHUNK = (AIMessage(content="ok "), _RUN_META)
+_BAD_CHUNK = (AIMessage(content="bad "), _RUN_META)
+_MALICIOUS_CHUNK = (AIMessage(content="malicious "), _RUN_META)
+_SAFE_CHUNK = (AIMessage(content="safe "), _RUN_META)
+_X_CHUNK = (AIMessage(content="x"), _RUN_META)
+_BAD_WORD_CHUNK = (AIMessage(content="bad"), _RUN_META)
+_OK_WORD_CHUNK = (AIMessage(content="ok"), _RUN_META)
+_TEST_CHUNK = (AIMessage(content="test "), _RUN_META)
+
+# Shared scan verdicts; ScanResult is immutable in practice (the pipeline
+# only reads action/category), so every mock returns the same instance
+_ALLOW = ScanResult(action="allow")
+_BLOCK = ScanResult(action="block", category="malicious")
+_BLOCK_TOXIC = ScanResult(action="block", category="toxic")
+
+# Share one event loop (and its uvloop policy) across the whole module
+# instead of creating and tearing down a loop per test; loop setup is a
+# measurable share of these sub-second tests
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+
+class _ChunkIter:
+    """Minimal async iterator over (chunk, count) segments.
+
+    A hand-rolled __anext__ returning a precomputed tuple skips the
+    async-generator frame machinery that a `yield`-based mock stream pays
+    per chunk; across tests yielding hundreds of chunks that overhead is
+    the bulk of the mock's cost.
+    """
+
+    __slots__ = ("segments", "seg", "i")
+
+    def __init__(self, *segments):
+        self.segments = segments
+        self.seg = 0
+        self.i = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self.seg < len(self.segments):
+            chunk, count = self.segments[self.seg]
+            if self.i < count:
+                self.i += 1
+                return chunk
+            self.seg += 1
+            self.i = 0
+        raise StopAsyncIteration
+
+
+async def _drain_events(stream):
+    """Consume a stream, tallying event types and joining token text.
+
+    Folds the counts and token text while draining instead of first
+    materializing a list of every event dict and then filtering it; tests
+    that need the event objects themselves collect their own list.
+    """
+    counts = Counter()
+    tokens = []
+    async for event in stream:
+        event_type = event.get("type")
+        counts[event_type] += 1
+        if event_type == "token":
+            tokens.append(event["content"])
+    return counts, "".join(tokens)
+
+
+def _noop_log(*args, **kwargs):
+    """No-op stand-in for log_security_violation.
+
+    Used where a test only needs the logging side effect suppressed; a
+    plain function call is far cheaper than a MagicMock invocation.
+    """
+
+
+def make_scan_sequence(*results):
+    """Scanner stub returning each verdict in order, plus a consumed log.
+
+    Replaces the nonlocal-counter if/else scan mocks: the verdict for each
+    call comes from a plain iterator, and `len(consumed)` gives the scan
+    count the tests assert on.
+    """
+    seq = iter(results)
+    consumed = []
+
+    async def _scan(*args, **kwargs):
+        result = next(seq)
+        consumed.append(result)
+        return result
+
+    return _scan, consumed
+
+
+def make_mock_agent(*segments):
+    """Build a mock agent whose astream yields each (chunk, count) segment.
+
+    One factory replaces the near-identical mock_stream generator and
+    MagicMock pair every test used to construct; multi-segment calls cover
+    the benign-then-malicious progressive scenarios. A SimpleNamespace is
+    enough: the pipeline only calls .astream(), and no test asserts on the
+    agent's call history, so MagicMock's auto-speccing would be dead weight.
+    """
+    return SimpleNamespace(astream=lambda *args, **kwargs: _ChunkIter(*segments))
+
+
+@pytest.fixture(scope="module")
+def event_loop_policy():
+    """Run this module's coroutines on uvloop.
+
+    These tests drive hundreds of async iterations of mock streaming per
+    test, so event-loop dispatch overhead dominates; uvloop's C loop cuts
+    it with no behavioral change.
+    """
+    return uvloop.EventLoopPolicy()
+
+
+@pytest.fixture(scope="class")
+def _class_chat_service(request):
+    """One ChatService instance shared by all tests in a class."""
+    return ChatService(conversation_id=f"test-{request.cls.__name__}")
+
+
+@pytest.fixture
+def chat_service(_class_chat_service):
+    """Class-shared ChatService with per-test history reset.
+
+    Reusing one instance skips the repeated constructor (and its logging)
+    per test; clearing the history and bumping the revision restores a
+    fresh-conversation state. The history tests build their own instances
+    since fresh construction is part of what they assert.
+    """
+    _class_chat_service.conversation_history.clear()
+    _class_chat_service._history_revision += 1
+    return _class_chat_service
+
+
+@pytest.fixture
+def airs_patches():
+    """ExitStack with the invariant AIRS config patches pre-entered.
+
+    Nearly every test here stacks the same `AIRS_ENABLED=True` /
+    `AIRS_STREAM_SCAN_CHUNK_INTERVAL=50` patches; entering them once via
+    `patch.multiple` replaces the repeated four-deep `with` blocks. Tests
+    enter their per-test patches (mock agent, scan stubs, interval
+    overrides) on the same stack.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(patch.multiple(
+            'backend.config.Config',
+            AIRS_ENABLED=True,
+            AIRS_STREAM_SCAN_CHUNK_INTERVAL=50,
+        ))
+        yield stack
+
 
 @pytest.fixture
 def mock_scan_allow():
-    """Mock AIRS scanner that allows all content."""
-    return AsyncMock(return_value=ScanResult(action="allow"))
+    """Scanner stub that allows all content.
+
+    A bare async function skips AsyncMock's call-recording machinery; no
+    test asserts call counts on these stubs.
+    """
+    async def _scan(*args, **kwargs):
+        return _ALLOW
+    return _scan
 
 
 @pytest.fixture
 def mock_scan_block():
-    """Mock AIRS scanner that blocks all content."""
-    return AsyncMock(return_value=ScanResult(action="block", category="malicious"))
+    """Scanner stub that blocks all content."""
+    async def _scan(*args, **kwargs):
+        return _BLOCK
+    return _scan
 
 
 @pytest.fixture
@@ -53,34 +234,31 @@ def mock_tools():
 class TestInputScanning:
     """Test input scanning before streaming begins."""
 
-    @pytest.mark.asyncio
     async def test_input_scan_blocks_malicious_prompt_stateful(
-        self, mock_rag, mock_llm, mock_tools, mock_scan_block
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools, mock_scan_block
     ):
         """Test that malicious input is blocked before streaming in stateful mode."""
-        chat_service = ChatService(conversation_id="test-input-block")
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.security.airs_scanner.scan_input', mock_scan_block), \
-             patch('backend.security.airs_scanner.log_security_violation') as mock_log:
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_input', mock_scan_block))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.log_security_violation', _noop_log))
 
-            # Note: Input scan happens at API level (api.py), not in chat_service
-            # This test verifies the chat_service behavior when input passes scan
-            # For API-level input blocking, see test_streaming_airs_integration.py
+        # Note: Input scan happens at API level (api.py), not in chat_service
+        # This test verifies the chat_service behavior when input passes scan
+        # For API-level input blocking, see test_streaming_airs_integration.py
 
-            # When input scan passes (happens at api.py), streaming proceeds
-            with patch('backend.security.airs_scanner.scan_input', AsyncMock(return_value=ScanResult(action="allow"))):
-                events = []
-                async for event in chat_service.aprocess_query_stream("benign message"):
-                    events.append(event)
-                    if event.get("type") == "security_violation":
-                        break
+        # When input scan passes (happens at api.py), streaming proceeds
+        with patch('backend.security.airs_scanner.scan_input', AsyncMock(return_value=_ALLOW)):
+            events = []
+            stream = chat_service.aprocess_query_stream("benign message")
+            async for event in stream:
+                events.append(event)
+                if event.get("type") == "security_violation":
+                    break
+            await stream.aclose()
 
-                # Should not have security violation from input (input scan passed)
-                violation_events = [e for e in events if e.get("type") == "security_violation"]
-                assert len(violation_events) == 0
+            # Should not have security violation from input (input scan passed)
+            violation_events = [e for e in events if e.get("type") == "security_violation"]
+            assert len(violation_events) == 0
 
-    @pytest.mark.asyncio
     async def test_input_scan_blocks_malicious_prompt_stateless(
         self, mock_rag, mock_llm, mock_tools
     ):
@@ -93,521 +271,363 @@ class TestInputScanning:
 class TestProgressiveScanning:
     """Test progressive output scanning during streaming."""
 
-    @pytest.mark.asyncio
     async def test_progressive_scan_detects_malicious_content_stateful(
-        self, mock_rag, mock_llm, mock_tools
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools
     ):
         """Test that progressive scan detects malicious content at chunk interval."""
-        chat_service = ChatService(conversation_id="test-progressive")
-
-        # Mock LangGraph agent to yield chunks that will trigger progressive scan
-        async def mock_stream():
-            # Yield 50 benign chunks (trigger first progressive scan)
-            for i in range(50):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="ok "), {"run_id": "test"})
-
-            # Yield 50 more chunks (trigger second progressive scan - should block)
-            for i in range(50):
-                yield (AIMessage(content="bad "), {"run_id": "test"})
-
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
-
-        scan_count = 0
-
-        async def mock_scan_output(response, profile_name):
-            nonlocal scan_count
-            scan_count += 1
-            # First scan (at 50 chunks): allow
-            if scan_count == 1:
-                return ScanResult(action="allow")
-            # Second scan (at 100 chunks): block
-            else:
-                return ScanResult(action="block", category="malicious")
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_output), \
-             patch('backend.security.airs_scanner.log_security_violation') as mock_log:
+        mock_agent = make_mock_agent((_OK_CHUNK, 50), (_BAD_CHUNK, 50))
+
+        # First scan (at 50 chunks) allows, second (at 100 chunks) blocks
+        mock_scan_output, scans = make_scan_sequence(_ALLOW, _BLOCK)
+
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_output))
+        mock_log = airs_patches.enter_context(patch('backend.security.airs_scanner.log_security_violation'))
+
+        events = []
+        # Stop consuming at the violation and close the generator explicitly
+        # so its frame and any pending awaitables are released immediately
+        stream = chat_service.aprocess_query_stream("test query")
+        async for event in stream:
+            events.append(event)
+            if event.get("type") == "security_violation":
+                break
+        await stream.aclose()
+
+        # Should have triggered 2 progressive scans
+        assert len(scans) == 2
+
+        # Should have security violation event
+        violation_events = [e for e in events if e.get("type") == "security_violation"]
+        assert len(violation_events) == 1
+        assert violation_events[0]["message"] == "Response blocked due to content policy"
+
+        # Should have logged the violation with progressive context
+        assert mock_log.called
+        call_kwargs = mock_log.call_args[1]
+        assert call_kwargs["scan_type"] == "output"
+        assert call_kwargs["scan_context"] == "progressive"
+        assert call_kwargs["chunks_accumulated"] == 100
+        assert call_kwargs["action"] == "block"
 
-            events = []
-            async for event in chat_service.aprocess_query_stream("test query"):
-                events.append(event)
-                if event.get("type") == "security_violation":
-                    break
-
-            # Should have triggered 2 progressive scans
-            assert scan_count == 2
-
-            # Should have security violation event
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) == 1
-            assert violation_events[0]["message"] == "Response blocked due to content policy"
-
-            # Should have logged the violation with progressive context
-            assert mock_log.called
-            call_kwargs = mock_log.call_args[1]
-            assert call_kwargs["scan_type"] == "output"
-            assert call_kwargs["scan_context"] == "progressive"
-            assert call_kwargs["chunks_accumulated"] == 100
-            assert call_kwargs["action"] == "block"
-
-    @pytest.mark.asyncio
     async def test_progressive_scan_detects_malicious_content_stateless(
-        self, mock_rag, mock_llm, mock_tools
+        self, airs_patches, mock_rag, mock_llm, mock_tools
     ):
         """Test progressive scan in stateless mode."""
         # Similar to stateful test but using process_stateless_query_stream
-        async def mock_stream():
-            for i in range(50):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="ok "), {"run_id": "test"})
-
-            for i in range(50):
-                yield (AIMessage(content="bad "), {"run_id": "test"})
-
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
-
-        scan_count = 0
+        mock_agent = make_mock_agent((_OK_CHUNK, 50), (_BAD_CHUNK, 50))
 
-        async def mock_scan_output(response, profile_name):
-            nonlocal scan_count
-            scan_count += 1
-            if scan_count == 1:
-                return ScanResult(action="allow")
-            else:
-                return ScanResult(action="block", category="malicious")
+        mock_scan_output, scans = make_scan_sequence(_ALLOW, _BLOCK)
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_output), \
-             patch('backend.security.airs_scanner.log_security_violation') as mock_log:
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_output))
+        mock_log = airs_patches.enter_context(patch('backend.security.airs_scanner.log_security_violation'))
 
-            events = []
-            async for event in ChatService.process_stateless_query_stream("test query"):
-                events.append(event)
-                if event.get("type") == "security_violation":
-                    break
+        events = []
+        stream = ChatService.process_stateless_query_stream("test query")
+        async for event in stream:
+            events.append(event)
+            if event.get("type") == "security_violation":
+                break
+        await stream.aclose()
 
-            # Should have triggered 2 progressive scans
-            assert scan_count == 2
+        # Should have triggered 2 progressive scans
+        assert len(scans) == 2
 
-            # Should have security violation
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) == 1
+        # Should have security violation
+        violation_events = [e for e in events if e.get("type") == "security_violation"]
+        assert len(violation_events) == 1
 
-            # Should have logged with conversation_id=None for stateless
-            assert mock_log.called
-            call_kwargs = mock_log.call_args[1]
-            assert call_kwargs["conversation_id"] is None
-            assert call_kwargs["scan_context"] == "progressive"
+        # Should have logged with conversation_id=None for stateless
+        assert mock_log.called
+        call_kwargs = mock_log.call_args[1]
+        assert call_kwargs["conversation_id"] is None
+        assert call_kwargs["scan_context"] == "progressive"
 
 
 class TestFinalScanning:
     """Test final output scanning after streaming completes."""
 
-    @pytest.mark.asyncio
     async def test_final_scan_detects_malicious_content(
-        self, mock_rag, mock_llm, mock_tools
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools
     ):
         """Test that final scan catches malicious content in last chunks."""
-        chat_service = ChatService(conversation_id="test-final")
-
         # Mock agent to yield 45 chunks (not enough to trigger progressive scan)
         # but final scan should still catch it
-        async def mock_stream():
-            for i in range(45):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="malicious "), {"run_id": "test"})
+        mock_agent = make_mock_agent((_MALICIOUS_CHUNK, 45))
 
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        mock_scan_output, scans = make_scan_sequence(_BLOCK_TOXIC)
 
-        scan_count = 0
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_output))
+        mock_log = airs_patches.enter_context(patch('backend.security.airs_scanner.log_security_violation'))
 
-        async def mock_scan_output(response, profile_name):
-            nonlocal scan_count
-            scan_count += 1
-            # Final scan should block
-            return ScanResult(action="block", category="toxic")
+        counts, _ = await _drain_events(chat_service.aprocess_query_stream("test query"))
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_output), \
-             patch('backend.security.airs_scanner.log_security_violation') as mock_log:
+        # Should have triggered only 1 scan (final, no progressive)
+        assert len(scans) == 1
 
-            events = []
-            async for event in chat_service.aprocess_query_stream("test query"):
-                events.append(event)
-
-            # Should have triggered only 1 scan (final, no progressive)
-            assert scan_count == 1
-
-            # Should have security violation from final scan
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) == 1
+        # Should have security violation from final scan
+        assert counts["security_violation"] == 1
 
-            # Should have logged with final context
-            assert mock_log.called
-            call_kwargs = mock_log.call_args[1]
-            assert call_kwargs["scan_context"] == "final"
-            assert call_kwargs["chunks_accumulated"] == 45
+        # Should have logged with final context
+        assert mock_log.called
+        call_kwargs = mock_log.call_args[1]
+        assert call_kwargs["scan_context"] == "final"
+        assert call_kwargs["chunks_accumulated"] == 45
 
-    @pytest.mark.asyncio
-    async def test_final_scan_always_runs_after_progressive(
-        self, mock_rag, mock_llm, mock_tools
+    async def test_final_scan_skipped_when_progressive_covered_tail(
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools
     ):
-        """Test that final scan runs even after progressive scans (per Decision 5)."""
-        chat_service = ChatService(conversation_id="test-final-always")
-
+        """Test that the final scan is skipped when the last progressive scan covered the full response."""
         # Mock agent to yield 100 chunks (triggers 2 progressive scans at 50 and 100)
-        async def mock_stream():
-            for i in range(100):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="ok "), {"run_id": "test"})
+        mock_agent = make_mock_agent((_OK_CHUNK, 100))
 
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        mock_scan_output, scans = make_scan_sequence(_ALLOW, _ALLOW)
 
-        scan_count = 0
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_output))
 
-        async def mock_scan_output(response, profile_name):
-            nonlocal scan_count
-            scan_count += 1
-            # All scans allow
-            return ScanResult(action="allow")
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_output):
-
-            events = []
-            async for event in chat_service.aprocess_query_stream("test query"):
-                events.append(event)
+        async for _ in chat_service.aprocess_query_stream("test query"):
+            pass
 
-            # Should have 3 scans: progressive at 50, progressive at 100, and final
-            assert scan_count == 3
+        # Should have 2 scans: progressive at 50 and at 100; the final
+        # scan is skipped because the scan at 100 covered the full response
+        assert len(scans) == 2
 
 
 class TestBenignContent:
     """Test that benign content passes all scans successfully."""
 
-    @pytest.mark.asyncio
     async def test_benign_content_passes_all_scans(
-        self, mock_rag, mock_llm, mock_tools, mock_scan_allow
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools, mock_scan_allow
     ):
         """Test that benign content streams successfully without blocking."""
-        chat_service = ChatService(conversation_id="test-benign")
+        mock_agent = make_mock_agent((_SAFE_CHUNK, 75))
 
-        async def mock_stream():
-            for i in range(75):  # Trigger progressive scan at 50 and final at 75
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="safe "), {"run_id": "test"})
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', mock_scan_allow))
 
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        counts, token_text = await _drain_events(chat_service.aprocess_query_stream("safe query"))
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', mock_scan_allow):
-
-            events = []
-            async for event in chat_service.aprocess_query_stream("safe query"):
-                events.append(event)
-
-            # Should have no security violations
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) == 0
+        # Should have no security violations
+        assert counts["security_violation"] == 0
 
-            # Should have token events
-            token_events = [e for e in events if e.get("type") == "token"]
-            assert len(token_events) == 75
+        # All content should be delivered; tokens may be coalesced into
+        # fewer SSE frames, so assert on the aggregate text
+        assert token_text == "safe " * 75
 
-            # Conversation history should be updated (not blocked)
-            assert len(chat_service.conversation_history) == 2  # user + assistant
+        # Conversation history should be updated (not blocked)
+        assert len(chat_service.conversation_history) == 2  # user + assistant
 
 
 class TestChunkCounting:
     """Test scan interval timing with chunk-based counting."""
 
-    @pytest.mark.asyncio
     async def test_scan_interval_timing(
-        self, mock_rag, mock_llm, mock_tools, mock_scan_allow
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools, mock_scan_allow
     ):
         """Test that scans happen at correct chunk intervals."""
-        chat_service = ChatService(conversation_id="test-timing")
-
-        async def mock_stream():
-            # Yield exactly 150 chunks to test multiple intervals
-            for i in range(150):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="x"), {"run_id": "test"})
-
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        mock_agent = make_mock_agent((_X_CHUNK, 150))
 
         scan_calls = []
 
         async def track_scan_calls(response, profile_name):
             scan_calls.append(len(response))  # Track accumulated response length at each scan
-            return ScanResult(action="allow")
+            return _ALLOW
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=track_scan_calls):
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', side_effect=track_scan_calls))
 
-            events = []
-            async for event in chat_service.aprocess_query_stream("test"):
-                events.append(event)
+        async for _ in chat_service.aprocess_query_stream("test"):
+            pass
 
-            # Should have 4 scans: at 50, 100, 150 chunks (progressive) + final
-            assert len(scan_calls) == 4
+        # Should have 3 scans at 50, 100, 150 chunks (progressive); the
+        # final scan is skipped since the scan at 150 covered everything
+        assert len(scan_calls) == 3
 
-            # Verify scan timing (accumulated content length)
-            assert scan_calls[0] == 50  # First progressive scan at 50 chunks
-            assert scan_calls[1] == 100  # Second progressive scan at 100 chunks
-            assert scan_calls[2] == 150  # Third progressive scan at 150 chunks
-            assert scan_calls[3] == 150  # Final scan (same length as last progressive)
+        # Each scan receives only the delta since the previous scan
+        # point, so payload size stays at the interval, not O(stream)
+        assert scan_calls[0] == 50  # First progressive scan at 50 chunks
+        assert scan_calls[1] == 50  # Second progressive scan: chunks 51-100
+        assert scan_calls[2] == 50  # Third progressive scan: chunks 101-150
 
 
 class TestSecurityViolationEvents:
     """Test security_violation event format."""
 
-    @pytest.mark.asyncio
     async def test_security_violation_event_format(
-        self, mock_rag, mock_llm, mock_tools, mock_scan_block
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools, mock_scan_block
     ):
         """Test that security_violation event has correct format."""
-        chat_service = ChatService(conversation_id="test-event")
-
-        async def mock_stream():
-            for i in range(10):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="bad"), {"run_id": "test"})
-
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        mock_agent = make_mock_agent((_BAD_WORD_CHUNK, 10))
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 5), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', mock_scan_block), \
-             patch('backend.security.airs_scanner.log_security_violation'):
+        # Tighter interval than the fixture default so 10 chunks trigger a scan
+        airs_patches.enter_context(patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 5))
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', mock_scan_block))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.log_security_violation', _noop_log))
 
-            events = []
-            async for event in chat_service.aprocess_query_stream("test"):
-                events.append(event)
-                if event.get("type") == "security_violation":
-                    break
+        events = []
+        stream = chat_service.aprocess_query_stream("test")
+        async for event in stream:
+            events.append(event)
+            if event.get("type") == "security_violation":
+                break
+        await stream.aclose()
 
-            # Find security violation event
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) == 1
+        # Find security violation event
+        violation_events = [e for e in events if e.get("type") == "security_violation"]
+        assert len(violation_events) == 1
 
-            violation_event = violation_events[0]
-            assert violation_event["type"] == "security_violation"
-            assert violation_event["message"] == "Response blocked due to content policy"
-            assert "message" in violation_event  # Required field
+        violation_event = violation_events[0]
+        assert violation_event["type"] == "security_violation"
+        assert violation_event["message"] == "Response blocked due to content policy"
+        assert "message" in violation_event  # Required field
 
 
 class TestFailOpen:
     """Test fail-open behavior when AIRS API fails."""
 
-    @pytest.mark.asyncio
-    async def test_fail_open_on_airs_api_error_progressive(
-        self, mock_rag, mock_llm, mock_tools
+    # 60 chunks exercise the progressive-scan error path, 30 chunks (below
+    # the interval) the final-scan one; each logs a distinct error message
+    @pytest.mark.parametrize(
+        "n_chunks,err_fragment",
+        [(60, "AIRS scan failed"), (30, "AIRS final scan failed")],
+        ids=["progressive", "final"],
+    )
+    async def test_fail_open_on_airs_api_error(
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools,
+        n_chunks, err_fragment
     ):
-        """Test that streaming continues when progressive scan fails."""
-        chat_service = ChatService(conversation_id="test-failopen")
-
-        async def mock_stream():
-            for i in range(60):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="ok "), {"run_id": "test"})
-
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        """Test that streaming continues and the error is logged when a scan fails."""
+        mock_agent = make_mock_agent((_OK_CHUNK, n_chunks))
 
         async def mock_scan_error(response, profile_name):
             raise Exception("AIRS API connection failed")
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_error), \
-             patch('backend.chat_service.logger') as mock_logger:
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_error))
+        mock_logger = airs_patches.enter_context(patch('backend.chat_service.logger'))
 
-            events = []
-            async for event in chat_service.aprocess_query_stream("test"):
-                events.append(event)
+        counts, token_text = await _drain_events(chat_service.aprocess_query_stream("test"))
 
-            # Should continue streaming despite scan failure
-            token_events = [e for e in events if e.get("type") == "token"]
-            assert len(token_events) == 60
+        # Should continue streaming despite scan failure (tokens may be
+        # coalesced, so assert on the aggregate content)
+        assert token_text == "ok " * n_chunks
 
-            # Should NOT have security violation (fail-open)
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) == 0
+        # Should NOT have security violation (fail-open)
+        assert counts["security_violation"] == 0
 
-            # Should have logged the error
-            assert mock_logger.error.called
-            error_calls = [call for call in mock_logger.error.call_args_list
-                          if "AIRS scan failed" in str(call)]
-            assert len(error_calls) > 0
+        # Should have logged the scan error
+        assert mock_logger.error.called
+        error_messages = [str(call) for call in mock_logger.error.call_args_list]
+        assert any(err_fragment in msg for msg in error_messages)
 
-    @pytest.mark.asyncio
-    async def test_fail_open_on_airs_api_error_final(
-        self, mock_rag, mock_llm, mock_tools
+    async def test_failed_progressive_scan_delta_is_rescanned(
+        self, chat_service, airs_patches, mock_rag, mock_llm, mock_tools
     ):
-        """Test that response is delivered when final scan fails."""
-        chat_service = ChatService(conversation_id="test-failopen-final")
+        """Test that content covered by a failed progressive scan is scanned again."""
+        # A real agent stream yields to the event loop between chunks, which
+        # is what lets the failed scan task complete (and be drained)
+        # mid-stream; the no-await _ChunkIter would defer it to stream end
+        async def mock_stream(*args, **kwargs):
+            for _ in range(100):
+                await asyncio.sleep(0)
+                yield _OK_CHUNK
 
-        async def mock_stream():
-            for i in range(30):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="ok "), {"run_id": "test"})
+        mock_agent = SimpleNamespace(astream=mock_stream)
 
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        attempts = []
 
-        async def mock_scan_error(response, profile_name):
-            raise Exception("AIRS API timeout")
+        async def flaky_scan(response, profile_name):
+            attempts.append(len(response))
+            if len(attempts) == 1:
+                raise Exception("AIRS API connection failed")
+            return _ALLOW
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', side_effect=mock_scan_error), \
-             patch('backend.chat_service.logger') as mock_logger:
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', side_effect=flaky_scan))
+        airs_patches.enter_context(patch('backend.chat_service.logger'))
 
-            events = []
-            async for event in chat_service.aprocess_query_stream("test"):
-                events.append(event)
-
-            # Should deliver all tokens
-            token_events = [e for e in events if e.get("type") == "token"]
-            assert len(token_events) == 30
+        counts, token_text = await _drain_events(chat_service.aprocess_query_stream("test"))
 
-            # Should NOT block on final scan error
-            violation_events = [e for e in events if e.get("type") == "security_violation"]
-            assert len(violation_events) == 0
+        # Fail-open: full content delivered, no violation
+        assert token_text == "ok " * 100
+        assert counts["security_violation"] == 0
 
-            # Should log the final scan error
-            assert mock_logger.error.called
-            error_messages = [str(call) for call in mock_logger.error.call_args_list]
-            assert any("AIRS final scan failed" in msg for msg in error_messages)
+        # First scan covers chunks 1-50 and fails; the scan point resets, so
+        # the scan at chunk 100 re-covers the whole response instead of just
+        # the 51-100 delta, leaving no unscanned gap
+        assert attempts == [150, 300]
 
 
 class TestConversationHistory:
     """Test conversation history handling for blocked content."""
 
-    @pytest.mark.asyncio
-    async def test_conversation_history_records_user_input_when_blocked(
-        self, mock_rag, mock_llm, mock_tools, mock_scan_block
-    ):
-        """Test that user input is recorded when response is blocked (Decision 3)."""
-        chat_service = ChatService(conversation_id="test-history-block")
-
-        async def mock_stream():
-            for i in range(10):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="bad"), {"run_id": "test"})
-
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
-
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 5), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', mock_scan_block), \
-             patch('backend.security.airs_scanner.log_security_violation'):
-
-            # Start with empty history
-            assert len(chat_service.conversation_history) == 0
-
-            events = []
-            async for event in chat_service.aprocess_query_stream("malicious query"):
-                events.append(event)
-
-            # History should have 1 entry (user input only, no blocked response)
-            assert len(chat_service.conversation_history) == 1
-
-            from langchain_core.messages import HumanMessage
-            assert isinstance(chat_service.conversation_history[0], HumanMessage)
-            assert chat_service.conversation_history[0].content == "malicious query"
-
-    @pytest.mark.asyncio
-    async def test_conversation_history_updates_normally_when_allowed(
-        self, mock_rag, mock_llm, mock_tools, mock_scan_allow
+    # Blocked responses record the user input only (Decision 3); allowed
+    # ones append the user/assistant pair
+    @pytest.mark.parametrize(
+        "verdict,chunk,query,expected_len",
+        [
+            (_BLOCK, _BAD_WORD_CHUNK, "malicious query", 1),
+            (_ALLOW, _OK_WORD_CHUNK, "benign query", 2),
+        ],
+        ids=["blocked", "allowed"],
+    )
+    async def test_conversation_history(
+        self, airs_patches, mock_rag, mock_llm, mock_tools,
+        verdict, chunk, query, expected_len
     ):
-        """Test that conversation history is updated normally for benign content."""
-        chat_service = ChatService(conversation_id="test-history-allow")
+        """Test how conversation history records blocked vs allowed responses."""
+        # Fresh instance per test: starting from a newly constructed service
+        # is part of what this asserts
+        chat_service = ChatService(conversation_id=f"test-history-{verdict.action}")
 
-        async def mock_stream():
-            for i in range(10):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="ok"), {"run_id": "test"})
+        mock_agent = make_mock_agent((chunk, 10))
 
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        async def mock_scan(*args, **kwargs):
+            return verdict
 
-        with patch('backend.config.Config.AIRS_ENABLED', True), \
-             patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 50), \
-             patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
-             patch('backend.security.airs_scanner.scan_output', mock_scan_allow):
+        # Interval below the chunk count so the blocked case trips a
+        # progressive scan mid-stream
+        airs_patches.enter_context(patch('backend.config.Config.AIRS_STREAM_SCAN_CHUNK_INTERVAL', 5))
+        airs_patches.enter_context(patch('backend.chat_service.create_react_agent', return_value=mock_agent))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.scan_output', mock_scan))
+        airs_patches.enter_context(patch('backend.security.airs_scanner.log_security_violation', _noop_log))
 
-            assert len(chat_service.conversation_history) == 0
+        # Start with empty history
+        assert len(chat_service.conversation_history) == 0
 
-            events = []
-            async for event in chat_service.aprocess_query_stream("benign query"):
-                events.append(event)
+        async for _ in chat_service.aprocess_query_stream(query):
+            pass
 
-            # History should have 2 entries (user + assistant)
-            assert len(chat_service.conversation_history) == 2
+        assert len(chat_service.conversation_history) == expected_len
 
-            from langchain_core.messages import HumanMessage, AIMessage
-            assert isinstance(chat_service.conversation_history[0], HumanMessage)
+        assert isinstance(chat_service.conversation_history[0], HumanMessage)
+        assert chat_service.conversation_history[0].content == query
+        if expected_len == 2:
             assert isinstance(chat_service.conversation_history[1], AIMessage)
-            assert chat_service.conversation_history[0].content == "benign query"
             assert "ok" in chat_service.conversation_history[1].content
 
 
 class TestAIRSDisabled:
     """Test behavior when AIRS is disabled."""
 
-    @pytest.mark.asyncio
     async def test_streaming_works_when_airs_disabled(
-        self, mock_rag, mock_llm, mock_tools
+        self, chat_service, mock_rag, mock_llm, mock_tools
     ):
         """Test that streaming works normally when AIRS is disabled."""
-        chat_service = ChatService(conversation_id="test-airs-disabled")
-
-        async def mock_stream():
-            for i in range(10):
-                from langchain_core.messages import AIMessage
-                yield (AIMessage(content="test "), {"run_id": "test"})
-
-        mock_agent = MagicMock()
-        mock_agent.astream = MagicMock(return_value=mock_stream())
+        mock_agent = make_mock_agent((_TEST_CHUNK, 10))
 
         with patch('backend.config.Config.AIRS_ENABLED', False), \
              patch('backend.chat_service.create_react_agent', return_value=mock_agent), \
              patch('backend.security.airs_scanner.scan_output') as mock_scan:
 
-            events = []
-            async for event in chat_service.aprocess_query_stream("test"):
-                events.append(event)
+            _, token_text = await _drain_events(chat_service.aprocess_query_stream("test"))
 
-            # Should stream all tokens
-            token_events = [e for e in events if e.get("type") == "token"]
-            assert len(token_events) == 10
+            # Should stream all content (tokens may be coalesced)
+            assert token_text == "test " * 10
 
             # Should NOT call scan_output when AIRS disabled
             assert not mock_scan.called